@@ -1,17 +1,26 @@
 
 import io
+import os
+import collections
+import concurrent.futures
+from pathlib import Path
 
 from .config import (
-    encode,
+    encode_to,
     decode
 )
+from .config import encode, iterparse, ConfigWriter  # noqa: F401
 
 from .entry import PreproBuf
+from .preprocessor import MacroEnvironment  # noqa: F401
+from .source import is_binary, open_source
+from .cache import IncludeCache  # noqa: F401
+from .treecache import load_cached
+from .rap import load_bin, loads_bin, dump_bin, dumps_bin  # noqa: F401
 
 
 def dump(obj, fp, *args, **kwargs):
-    for x in encode(obj, *args, **kwargs):
-        fp.write(x)
+    encode_to(obj, fp, *args, **kwargs)
 
     return fp
 
@@ -24,17 +33,98 @@ def dumps(obj, *args, **kwargs):
     return read
 
 
-def load(fp, *args, **kwargs):
+def load(fp, *args, cache_dir=None, encoding=None, **kwargs):
+    """
+    Decodes `fp`, a text stream, or a path, a file opened in binary mode
+    or bytes. The latter are decoded as they are read (see `open_source`),
+    with their encoding detected unless `encoding` is given.
+    """
+    if is_binary(fp):
+        with open_source(fp, encoding) as stream:
+            return load(stream, *args, cache_dir=cache_dir, **kwargs)
+
+    if cache_dir is not None:
+        return load_cached(fp, cache_dir, *args, **kwargs)
+
     return decode(fp, *args, **kwargs)
 
 
 def loads(string, *args, **kwargs):
+    if not isinstance(string, str):
+        # Bytes
+        return load(string, *args, **kwargs)
+
     return load(io.StringIO(string), *args, **kwargs)
 
 
+def _load_path(path, kwargs):
+    try:
+        return load(path, **kwargs)
+    except Exception as e:
+        return e
+
+
+def _load_paths(paths, kwargs):
+    return [_load_path(path, kwargs) for path in paths]
+
+
+def load_many(paths, workers=None, **kwargs):
+    """
+    Loads the files at `paths` on a pool of `workers` processes
+    (defaults to the amount of CPUs), passing `kwargs` to `load`.
+
+    Returns an ordered dict of each path to its config, in the order
+    of `paths`. Files that fail to load map to the exception raised
+    instead, so that one bad file does not abort the rest. If a worker
+    process dies (e.g. crashing or running out of memory), the files that
+    were not loaded yet map to the `BrokenProcessPool` error instead.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = _load_paths(paths, kwargs)
+    else:
+        chunksize = max(1, len(paths) // (workers * 4))
+        chunks = [paths[i:i + chunksize]
+                  for i in range(0, len(paths), chunksize)]
+        results = []
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_load_paths, chunk, kwargs)
+                       for chunk in chunks]
+
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results.extend(future.result())
+                except concurrent.futures.process.BrokenProcessPool as e:
+                    results.extend([e] * len(chunk))
+
+    return collections.OrderedDict(zip(paths, results))
+
+
 def preprocess(stream, **kwargs):
     return PreproBuf(stream, **kwargs)
 
 
 def preprocess_s(string, **kwargs):
     return PreproBuf(io.StringIO(string), **kwargs)
+
+
+def compile_macros(*sources, defines=None, **kwargs):
+    """
+    Preprocesses the headers `sources` (paths or streams) in order,
+    returning a `MacroEnvironment` of the macros they define, to be passed
+    to `load` as `defines`. Their output is discarded.
+    `defines` is an environment to start from.
+    """
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            # Included, so that the include guard of the header is found
+            source = io.StringIO('#include "%s"\n' % Path(source).resolve())
+
+        buf = PreproBuf(source, defines=defines, **kwargs)
+        buf.read()
+        defines = buf.preprocessor.environment()
+
+    return defines if defines is not None else MacroEnvironment()
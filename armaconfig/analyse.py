@@ -1,8 +1,9 @@
 
+import re
 import enum
 import collections
 
-from .entry import Scanner, EOL
+from .entry import Scanner, Streambuf, Token, EOL, DEFAULT_STREAM_NAME
 from .exceptions import UnexpectedType, UnexpectedValue
 
 
@@ -10,10 +11,26 @@ class NodeType(enum.Enum):
     CLASS = 1
     PROPERTY = 2
 
+    # A class whose body has been skipped, see `TextParser.parse_class`
+    LAZY_CLASS = 3
+
+    # A class declared without a body (`class name;`)
+    EXTERN_CLASS = 4
+
 
 Node = collections.namedtuple('Node', ['type', 'args'])
 
 
+class EventType(enum.Enum):
+    START_CLASS = 1
+    PROPERTY = 2
+    END_CLASS = 3
+    EXTERN_CLASS = 4
+
+
+Event = collections.namedtuple('Event', ['type', 'args'])
+
+
 class Parser:
     def __init__(self, unit, *args, **kwargs):
         self._scanner = Scanner(unit, *args, **kwargs)
@@ -80,7 +97,9 @@ class Parser:
                 _, v = valuetoken = self._scanner.next_token(
                     expect_typ=[self._scanner.Types.SYMBOL])
 
-                if v == ':':
+                if v == ';':
+                    return Node(NodeType.EXTERN_CLASS, (name,))
+                elif v == ':':
                     inherits, opener = (
                         x.value
                         for x in self._scanner.sequence(
@@ -141,3 +160,238 @@ class Parser:
                 break
 
             yield nxt
+
+
+class TextParser:
+    """
+    Parser for input that does not need to be preprocessed.
+
+    The input is read in one go, and parsed by matching regular expressions
+    at an offset into the resulting string, without creating tokens for
+    anything but errors. Yields the same nodes as `Parser`.
+
+    `string` is parsed instead of the contents of `unit` if given.
+    When `lazy` is set, the bodies of classes are skipped, yielding
+    `NodeType.LAZY_CLASS` nodes with the offset of the body instead.
+    """
+    Types = Scanner.Types
+
+    SEPERATORS = (',', ';', '}')
+
+    _WS_RE = re.compile(r'\s*')
+    _STRING_RE = re.compile(r'"[^"]*(?:""[^"]*)*"')
+    _VALUE_RE = re.compile(r'(?:[^";]+|"[^"]*(?:""[^"]*)*")*')
+    _ELEMENT_RE = re.compile(r'(?:[^",;}]+|"[^"]*(?:""[^"]*)*")*')
+    _BRACE_RE = re.compile(r'"[^"]*"|[{}"]')
+
+    def __init__(self, unit, string=None, lazy=False):
+        if string is None:
+            stream = Streambuf(unit)
+
+            self._unit = stream.current['name']
+            self._string = stream.read()
+        else:
+            self._unit = getattr(unit, 'name', DEFAULT_STREAM_NAME)
+            self._string = string
+
+        self._pos = 0
+        self._lazy = lazy
+
+    def _make_token(self, pos):
+        match = Scanner.TOKEN_RE.match(self._string, pos)
+
+        if match is None:
+            raise EOL()
+
+        typ, value = self.Types[match.lastgroup], match.group()
+        read = match.end()
+
+        if typ in (self.Types.IDENTIFIER, self.Types.STRING):
+            read += 1
+
+            if typ == self.Types.STRING:
+                value = self._unescape(value)
+
+        lineno = self._string.count('\n', 0, read) + 1
+        line_start = self._string.rfind('\n', 0, read) + 1
+
+        return Token(typ, value, lineno, read - line_start, self._unit)
+
+    def _unescape(self, value):
+        if '"' not in value:
+            return value
+
+        return self._STRING_RE.sub(
+            lambda m: m.group()[1:-1].replace('""', '"'), value)
+
+    def _skip_ws(self):
+        self._pos = self._WS_RE.match(self._string, self._pos).end()
+
+    def _next(self, expect_typ=None, expect_val=None):
+        self._skip_ws()
+
+        pos = self._pos
+        match = Scanner.TOKEN_RE.match(self._string, pos)
+
+        if match is None:
+            raise EOL()
+
+        typ, value = self.Types[match.lastgroup], match.group()
+
+        if typ == self.Types.STRING:
+            value = self._unescape(value)
+        elif typ == self.Types.UNSPECIFIED and value == '"':
+            # Unterminated string
+            raise EOL()
+
+        if expect_typ is not None:
+            if not (typ in expect_typ if isinstance(expect_typ, list)
+                    else typ == expect_typ):
+                raise UnexpectedType(expect_typ, self._make_token(pos))
+
+        if expect_val is not None and value != expect_val:
+            raise UnexpectedValue(expect_val, self._make_token(pos))
+
+        self._pos = match.end()
+
+        return typ, value, pos
+
+    def _parse_value(self):
+        end = self._VALUE_RE.match(self._string, self._pos).end()
+
+        if not self._string.startswith(';', end):
+            raise EOL()
+
+        value = self._unescape(self._string[self._pos:end])
+        self._pos = end + 1
+
+        return value
+
+    def _parse_array(self):
+        output = []
+
+        while True:
+            self._skip_ws()
+
+            if self._string.startswith('{', self._pos):
+                self._pos += 1
+
+                output.append(self._parse_array())
+                _, seperator, pos = self._next()
+            else:
+                pos = self._ELEMENT_RE.match(self._string, self._pos).end()
+                seperator = self._string[pos:pos + 1]
+
+                if not seperator or seperator == '"':
+                    raise EOL()
+
+                output.append(self._unescape(self._string[self._pos:pos]))
+                self._pos = pos + 1
+
+            if seperator == '}':
+                return output
+            elif seperator not in self.SEPERATORS:
+                raise UnexpectedValue(self.SEPERATORS, self._make_token(pos))
+
+    def _skip_class(self):
+        depth = 1
+
+        for match in self._BRACE_RE.finditer(self._string, self._pos):
+            brace = match.group()
+
+            if brace == '{':
+                depth += 1
+            elif brace == '"':
+                # Unterminated string
+                break
+            elif brace == '}':
+                depth -= 1
+
+                if not depth:
+                    self._pos = match.end()
+                    self._next(expect_val=';')
+
+                    return
+
+        raise EOL()
+
+    def _iter_class(self):
+        typ, val, pos = self._next()
+
+        while not (typ == self.Types.SYMBOL and val == '}'):
+            yield self._parse_node(typ, val, pos)
+
+            typ, val, pos = self._next()
+
+        self._next(expect_val=';')
+
+    def _parse_node(self, typ, val, pos):
+        if typ != self.Types.IDENTIFIER:
+            raise UnexpectedType(self.Types.IDENTIFIER, self._make_token(pos))
+
+        if val == 'class':
+            _, name, _ = self._next(expect_typ=[self.Types.IDENTIFIER])
+            _, v, value_pos = self._next(expect_typ=[self.Types.SYMBOL])
+
+            if v == ';':
+                return Node(NodeType.EXTERN_CLASS, (name,))
+            elif v == ':':
+                _, inherits, _ = self._next(expect_typ=self.Types.IDENTIFIER)
+                _, opener, _ = self._next(expect_typ=self.Types.SYMBOL)
+            else:
+                inherits, opener = None, v
+
+            if opener != '{':
+                raise UnexpectedValue(['{'], self._make_token(value_pos))
+
+            if self._lazy:
+                start = self._pos
+                self._skip_class()
+
+                return Node(NodeType.LAZY_CLASS, (name, inherits, start))
+
+            return Node(NodeType.CLASS, (name, inherits, self._iter_class()))
+
+        _, next_val, next_pos = self._next(expect_typ=self.Types.SYMBOL)
+
+        if next_val == '[':
+            self._next(expect_val=']')
+            self._next(expect_val='=')
+            self._next(expect_val='{')
+
+            property_value = self._parse_array()
+
+            self._next(expect_val=';')
+        elif next_val == '=':
+            property_value = self._parse_value()
+        else:
+            raise UnexpectedValue('=', self._make_token(next_pos))
+
+        return Node(NodeType.PROPERTY, (val, property_value))
+
+    def parse(self):
+        while True:
+            try:
+                typ, val, pos = self._next()
+            except EOL:
+                break
+
+            yield self._parse_node(typ, val, pos)
+
+    def parse_class(self, start, lazy=None):
+        """
+        Parses the body of a class skipped in lazy mode,
+        starting at offset `start`. The classes within it are skipped
+        as well, unless `lazy` is False. The position of the parser is
+        restored afterwards, so that other parses are not affected.
+        """
+        was_lazy, pos = self._lazy, self._pos
+        self._pos = start
+
+        if lazy is not None:
+            self._lazy = lazy
+
+        try:
+            yield from self._iter_class()
+        finally:
+            self._lazy, self._pos = was_lazy, pos
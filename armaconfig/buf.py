@@ -1,40 +1,58 @@
 
 import abc
+import itertools
 from .exceptions import EOL
+from .utils import WHITESPACE_RE
 
 
 def get_string(buf):
     """
     This function assumes that the first " has been found
     """
-    def callback(char):
-        if char == '"':
-            if buf.peek(1) != '"':
-                return False
+    seq = []
 
-            buf.advance(1)
+    while True:
+        seq.append(buf.find_delim('"', advance=True))
 
-        return True
+        if buf.peek(1) != '"':
+            return ''.join(seq)
 
-    return buf.find_with_cb(callback, length=1, advance=True)
+        buf.advance(1)
+        seq.append('"')
 
 
 class Buf(abc.ABC):
     """
-    Helper class that provides methods for reading chars from a buffer.
+    Helper class that provides methods for reading items from a buffer.
+
+    The buffer is kept as a sequence and an offset into it, so that
+    advancing does not have to move the remaining items. The items that
+    have been read are dropped the next time the buffer is extended.
     """
+    # Type of the sequence used as buffer
+    buf_type = list
+
     def __init__(self):
-        self._buf = []
+        self._buf = self.buf_type()
+        self._offset = 0
 
     @abc.abstractmethod
     def _fill_buf(self, length=1): pass
 
+    def _available(self):
+        return len(self._buf) - self._offset
+
+    def _extend(self, items):
+        if self._offset:
+            self._buf = self._buf[self._offset:] + items
+            self._offset = 0
+        else:
+            self._buf += items
+
     def _peek_raw(self, length=1):
         self._fill_buf(length)
 
-        slice_ = self._buf[:length]
-
-        return slice_
+        return self._buf[self._offset:self._offset + length]
 
     def peek(self, *args, **kwargs):
         return self._peek_raw(*args, **kwargs)
@@ -42,7 +60,7 @@ class Buf(abc.ABC):
     def advance(self, length=1):
         self._fill_buf(length)
 
-        del self._buf[:length]
+        self._offset = min(self._offset + length, len(self._buf))
 
     def get(self, length=1):
         seq = self.peek(length)
@@ -50,7 +68,7 @@ class Buf(abc.ABC):
         if length and not seq:
             raise EOL()
 
-        self.advance(length)
+        self._offset += len(seq)
 
         return seq
 
@@ -65,61 +83,185 @@ class Buf(abc.ABC):
 
 
 class Charbuf(Buf):
-    def peek(self, *args, **kwargs):
-        return ''.join(super().peek(*args, **kwargs))
+    """
+    Buffer of characters.
+
+    The `find_*` methods look for the end of what they are searching for
+    in the buffered string, and return a slice of it, instead of reading
+    and checking one character at a time.
+    """
+    buf_type = str
+
+    def _fill_visible(self, length):
+        """
+        Makes `length` characters from the read offset available in the
+        buffer, without counting them as read. Only differs from `_fill_buf`
+        for buffers that read their source in blocks.
+        """
+        self._fill_buf(length)
+
+    def _fill_more(self):
+        available = self._available()
 
-    def find_delim(self, delim, advance=False):
-        seq = ''
+        try:
+            self._fill_visible(available + 1)
+        except EOL:
+            return False
+
+        return self._available() > available
+
+    def _read_to_end(self):
+        """
+        Consumes what is left, as reading until the end one character at
+        a time would, and raises EOL.
+        """
+        self.advance(self._available())
+
+        raise EOL()
+
+    def _find_cb_end(self, callback, length=1, step=None):
+        """
+        Returns the offset from the read position of the first sequence of
+        `length` characters for which `callback` returns false, moving `step`
+        characters at a time, together with that sequence.
+        """
+        end = 0
+
+        while True:
+            while self._available() < end + length and self._fill_more():
+                pass
+
+            index = self._offset + end
+            check = self._buf[index:index + length]
+
+            if not callback(check):
+                return end, check
+            elif len(check) < length:
+                self._read_to_end()
+
+            end += step or length
+
+    def find_delim(self, delim, advance=False, to_end=False):
+        """
+        Returns the characters up to `delim`, advancing past them (and past
+        `delim` if `advance` is set). Raises EOL if there is no `delim`,
+        unless `to_end` is set, in which case the rest is returned.
+        """
         length = len(delim)
+        start = 0
 
-        while self.peek(length) != delim:
-            seq += self.get(1)
+        while True:
+            index = self._buf.find(delim, self._offset + start)
 
-        if advance:
-            self.advance(length)
+            if index != -1:
+                break
+
+            start = max(0, self._available() - length + 1)
+
+            if not self._fill_more():
+                if to_end:
+                    seq = self._buf[self._offset:]
+                    self.advance(len(seq))
+
+                    return seq
+
+                self._read_to_end()
+
+        end = index - self._offset
+
+        # The delimiter has been looked at
+        self._fill_buf(end + length)
+
+        seq = self._buf[self._offset:self._offset + end]
+        self._offset += end + length if advance else end
 
         return seq
 
     def find_with_cb(self, callback, length=1, advance=False):
-        # TODO: Ensure this does not raise EOL
-        seq = ''
-        getter = self.get if advance else self.peek
-        is_peek = not advance
+        end, check = self._find_cb_end(callback, length)
 
-        check = getter(length)
+        # The sequence that ended the search has been looked at
+        self._fill_buf(end + length)
 
-        while callback(check):
-            seq += check
+        seq = self._buf[self._offset:self._offset + end]
+        self._offset += end
 
-            if is_peek:
-                self.advance(length)
+        if advance:
+            if length and not check:
+                raise EOL()
 
-            check = getter(length)
+            self._offset += len(check)
 
         return seq
 
     def peek_cb(self, callback, length=1):
-        seq = ''
-        offset = 0
-        check = self.peek(length)
+        end, _ = self._find_cb_end(callback, length, step=1)
+
+        self._fill_buf(end + length)
+
+        return self._buf[self._offset:self._offset + end]
+
+    def skip_ws(self):
+        """
+        Advances past a run of whitespace, which is returned.
+        Nothing after the whitespace is read.
+        """
+        seq = []
+
+        while True:
+            end = WHITESPACE_RE.match(self._buf, self._offset).end()
+
+            if end > self._offset:
+                seq.append(self._buf[self._offset:end])
+                self.advance(end - self._offset)
+
+            if self._available() or not self._fill_more():
+                return ''.join(seq)
+
+    def find_re(self, regex):
+        """
+        Matches the compiled `regex` at the read position, and returns
+        and advances past the match. As with `find_with_cb`, the character
+        after the match is looked at, so that the match can not continue,
+        unless the match ends the input.
+        """
+        while True:
+            match = regex.match(self._buf, self._offset)
+
+            if match is not None and match.end() < len(self._buf):
+                lookahead = 1
+
+                break
+            elif not self._fill_more():
+                if match is None:
+                    self._read_to_end()
+
+                lookahead = 0
 
-        while callback(check):
-            offset += 1
-            seq += check
-            check = self.peek(offset + length)[offset:]
+                break
+
+        seq = match.group()
+
+        self._fill_buf(len(seq) + lookahead)
+        self._offset += len(seq)
 
         return seq
 
 
 class Strbuf(Charbuf):
+    """
+    Buffer reading from an iterator of characters, or from a string.
+    """
     def __init__(self, iterator):
-        self.iterator = iterator
-
         super().__init__()
 
+        if isinstance(iterator, str):
+            self._buf, iterator = iterator, iter(())
+
+        self.iterator = iterator
+
     def _fill_buf(self, length=1):
-        for _ in range(length - len(self._buf)):
-            try:
-                self._buf.append(next(self.iterator))
-            except StopIteration:
-                return
+        missing = length - self._available()
+
+        if missing > 0:
+            self._extend(''.join(itertools.islice(self.iterator, missing)))
@@ -0,0 +1,99 @@
+"""
+Caching of included files, shareable between loads.
+"""
+
+import io
+import os
+import collections
+from pathlib import Path
+from .source import open_source
+
+# Default amount of characters kept by an IncludeCache
+DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+
+class IncludeCache:
+    """
+    Least recently used cache of the contents of included files.
+
+    Entries are keyed by the resolved path of the file, and are read again
+    once the modification time or size of the file changes. The least
+    recently used entries are evicted once the total size of the cached
+    contents exceeds `max_size` characters.
+
+    The same cache can be passed to several `load` calls:
+
+        cache = IncludeCache()
+
+        for path in paths:
+            with open(path) as fp:
+                configs.append(load(fp, include_cache=cache))
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return str(Path(path).resolve()) in self._entries
+
+    def get(self, path):
+        """
+        Returns the contents of the file at `path`,
+        reading it only if it is not cached or has changed.
+        """
+        key = str(Path(path).resolve())
+        stat = os.stat(key)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._entries.get(key)
+
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+        self.misses += 1
+
+        with open_source(key) as fp:
+            contents = fp.read()
+
+        self._store(key, version, contents)
+
+        return contents
+
+    def open(self, path):
+        """
+        Returns a stream of the contents of the file at `path`,
+        named after `path` like a file opened with `open` would be.
+        """
+        stream = io.StringIO(self.get(path))
+        stream.name = str(path)
+
+        return stream
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def _store(self, key, version, contents):
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key)[1])
+
+        if len(contents) > self.max_size:
+            return
+
+        self._entries[key] = (version, contents)
+        self.size += len(contents)
+
+        while self.size > self.max_size:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
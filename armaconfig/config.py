@@ -1,16 +1,53 @@
 
-from collections import OrderedDict, namedtuple, abc
-from .analyse import Parser, NodeType
-from .entry import DEFAULT_STREAM_NAME
+import re
+import sys
+import array
+import fnmatch
+import functools
+import itertools
+from collections import namedtuple, abc
+from .analyse import Parser, TextParser, NodeType, EventType, Event
+from .entry import DEFAULT_STREAM_NAME, PreproBuf
 from .utils import tag_last
 
-ValueNode = namedtuple('ValueNode', ['name', 'value'])
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# `append` is set for arrays extending the inherited array (`name[] += {}`),
+# of which the value is only the items appended
+ValueNode = namedtuple('ValueNode', ['name', 'value', 'append'],
+                       defaults=[False])
+
+# `delete name;`, removing an inherited class
+DeleteNode = namedtuple('DeleteNode', ['name'])
+
+
+def _int_floats(items):
+    return [
+        _int_floats(x) if isinstance(x, list)
+        else int(x) if type(x) is float and x.is_integer() and abs(x) < 2 ** 53
+        else x for x in items]
+
+
+def _array_items(value):
+    # The items of an array.array or numpy array (or the value of a numpy
+    # scalar). Ints in arrays of floats are stored as floats, so the floats
+    # in them that are exactly ints are written as ints again.
+    items = value.tolist()
+
+    return _int_floats(items) if isinstance(items, list) else items
 
 
 class Encoder:
+    # Amount of fragments `write` buffers before writing them out
+    BUFFER_FRAGMENTS = 4096
+
     def __init__(self, indent=None):
         self._indent = indent
         self._indent_lvl = 0
+        self._separators = []
 
     def _make_indent(self, pre=None, post=None):
         if not self._indent:
@@ -25,10 +62,19 @@ class Encoder:
             yield post
 
     def _encode_one(self, node):
+        if hasattr(node, 'tolist'):
+            # array.array and numpy arrays (or scalars)
+            node = _array_items(node)
+
         if isinstance(node, Config):
             yield 'class %s' % node.name
 
-            if node.inherits:
+            if node.external:
+                yield ';'
+
+                return
+
+            if node.inherits is not None:
                 yield ' : ' + node.inherits.name
 
             self._indent_lvl += 1
@@ -44,14 +90,17 @@ class Encoder:
         elif isinstance(node, ValueNode):
             yield node.name
 
-            is_array = isinstance(node.value, (list, tuple))
+            is_array = isinstance(
+                node.value, (list, tuple)) or hasattr(node.value, 'tolist')
 
             if is_array:
                 yield '[]'
 
-            yield ' = '
+            yield ' += ' if node.append else ' = '
             yield from self._encode_one(node.value)
             yield ';'
+        elif isinstance(node, DeleteNode):
+            yield 'delete %s;' % node.name
         elif isinstance(node, (list, tuple)):
             yield '{'
 
@@ -86,11 +135,250 @@ class Encoder:
             if not is_last:
                 yield from self._make_indent(pre='\n')
 
+    def write(self, iterable, fp):
+        """
+        Encodes the nodes of `iterable` into `fp`, with the same output
+        as `encode`. The output is assembled in a buffer written out
+        every `BUFFER_FRAGMENTS` fragments, instead of writing each
+        fragment as it is generated.
+        """
+        out = []
+        separator = self.separator(self._indent_lvl)
+
+        for i, x in enumerate(iterable):
+            if i:
+                out.append(separator)
+
+            self.write_node(x, self._indent_lvl, out, fp)
+
+        self.flush(out, fp, force=True)
+
+    def write_node(self, node, level, out, fp):
+        """
+        Appends the output of `node`, an entry of a class at nesting
+        `level`, to the list of fragments `out`, writing them out
+        to `fp` (see `flush`) as they add up.
+        """
+        self._write_one(node, level, out, fp)
+        self.flush(out, fp)
+
+    def flush(self, out, fp, force=False):
+        """
+        Writes the fragments of `out` to `fp` and clears it, once it holds
+        `BUFFER_FRAGMENTS` of them (or in any case if `force` is set).
+        """
+        if force or len(out) >= self.BUFFER_FRAGMENTS:
+            fp.write(''.join(out))
+            out.clear()
+
+    def separator(self, level):
+        """
+        Returns the (precomputed) newline and indentation preceding
+        the entries of a class or array at nesting `level`.
+        """
+        if not self._indent:
+            return ''
 
-def encode(node, *args, **kwargs):
-    include_self = kwargs.pop('include_self', False)
-    encoder = Encoder(*args, **kwargs)
+        try:
+            return self._separators[level]
+        except IndexError:
+            self._separators.extend(
+                '\n' + ' ' * self._indent * x
+                for x in range(len(self._separators), level + 1))
+
+            return self._separators[level]
+
+    def class_start(self, name, inherits, level):
+        """
+        Returns the start of the body of the class `name` at nesting
+        `level`, inheriting from the class named `inherits` if not None.
+        """
+        if inherits is not None:
+            return 'class %s : %s {%s' % (
+                name, inherits, self.separator(level + 1))
+
+        return 'class %s {%s' % (name, self.separator(level + 1))
+
+    def class_end(self, level):
+        """
+        Returns the end of the body of a class at nesting `level`.
+        """
+        return self.separator(level) + '};'
+
+    def _write_one(self, node, level, out, fp):
+        if hasattr(node, 'tolist'):
+            # array.array and numpy arrays (or scalars)
+            node = _array_items(node)
+
+        if isinstance(node, ValueNode):
+            value = node.value
+
+            if isinstance(value, str):
+                out.append('%s = "%s";' % (
+                    node.name, value.replace('"', '""')))
+            elif type(value) is int:
+                out.append('%s = %d;' % (node.name, value))
+            elif isinstance(value, (list, tuple)) or hasattr(value, 'tolist'):
+                out.append(node.name + ('[] += ' if node.append else '[] = '))
+                self._write_one(value, level, out, fp)
+                out.append(';')
+            else:
+                out.append(node.name + ' = ')
+                self._write_one(value, level, out, fp)
+                out.append(';')
+        elif isinstance(node, DeleteNode):
+            out.append('delete %s;' % node.name)
+        elif isinstance(node, (list, tuple)):
+            if not node:
+                out.append('{}')
+
+                return
+
+            separator = self.separator(level + 1)
+            out.append('{' + separator)
+
+            for i, x in enumerate(node):
+                if i:
+                    out.append(',' + separator)
+
+                self._write_one(x, level + 1, out, fp)
+
+            out.append(self.separator(level) + '}')
+        elif isinstance(node, str):
+            out.append('"%s"' % node.replace('"', '""'))
+        elif isinstance(node, bool):
+            out.append(str(int(node)))
+        elif isinstance(node, int):
+            out.append(str(node))
+        elif isinstance(node, Config):
+            if node.external:
+                out.append('class %s;' % node.name)
+
+                return
+
+            separator = self.separator(level + 1)
+            inherits = node.inherits
+
+            out.append(self.class_start(
+                node.name, inherits.name if inherits is not None else None,
+                level))
+
+            for i, x in enumerate(node.values_raw()):
+                if i:
+                    out.append(separator)
+
+                self._write_one(x, level + 1, out, fp)
+                self.flush(out, fp)
+
+            out.append(self.class_end(level))
+        else:
+            out.append(str(node))
+
+
+class ConfigWriter:
+    """
+    Writes a config to `fp` entry by entry, without building a `Config`
+    first, so that memory use does not grow with the size of the config.
+    Values are encoded the same way `Encoder` encodes them:
+
+        with ConfigWriter(fp, indent=4) as writer:
+            writer.begin_class('CfgVehicles')
+
+            for row in rows:
+                writer.begin_class(row.name, 'Car_F')
+                writer.prop('displayName', row.display_name)
+                writer.end_class()
+
+            writer.end_class()
+
+    The output is buffered like `Encoder.write` buffers it, and written
+    out completely on `close` (or leaving the `with` block).
+    """
+
+    def __init__(self, fp, indent=None):
+        self._fp = fp
+        self._out = []
+        self._encoder = Encoder(indent)
+
+        # The names of the open classes, and whether
+        # anything was written at each level yet
+        self._classes = []
+        self._written = [False]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.flush()
+
+    def _begin_entry(self):
+        if self._written[-1]:
+            self._out.append(self._encoder.separator(len(self._classes)))
+
+        self._written[-1] = True
+
+    def _write_node(self, node):
+        self._begin_entry()
+        self._encoder.write_node(node, len(self._classes), self._out, self._fp)
+
+    def begin_class(self, name, inherits=None):
+        """
+        Starts the class `name`, inheriting from the class named `inherits`.
+        The entries written until the matching `end_class` are its entries.
+        """
+        self._begin_entry()
+        self._out.append(
+            self._encoder.class_start(name, inherits, len(self._classes)))
+
+        self._classes.append(name)
+        self._written.append(False)
+
+    def end_class(self):
+        if not self._classes:
+            raise ValueError('No class to end')
+
+        self._classes.pop()
+        self._written.pop()
 
+        self._out.append(self._encoder.class_end(len(self._classes)))
+        self._encoder.flush(self._out, self._fp)
+
+    def prop(self, name, value):
+        """
+        Writes the property `name`. Lists, tuples and arrays
+        are written as array properties (`name[] = {...};`).
+        """
+        self._write_node(ValueNode(name, value))
+
+    def extern_class(self, name):
+        """
+        Declares the class `name` without a body (`class name;`).
+        """
+        self._begin_entry()
+        self._out.append('class %s;' % name)
+
+    def delete(self, name):
+        self._write_node(DeleteNode(name))
+
+    def flush(self):
+        self._encoder.flush(self._out, self._fp, force=True)
+
+    def close(self):
+        """
+        Writes out the buffered output. Raises a `ValueError`
+        if any classes have not been ended.
+        """
+        self.flush()
+
+        if self._classes:
+            raise ValueError('Classes not ended: %s' % '/'.join(self._classes))
+
+
+def _encode_nodes(node, include_self):
+    # The nodes `encode` encodes for `node`
     if not isinstance(node, Config):
         if isinstance(node, dict):
             node = Config.from_dict(DEFAULT_STREAM_NAME, node)
@@ -100,66 +388,578 @@ def encode(node, *args, **kwargs):
                 'expected dict, config, got %s' % (str(type(node))))
 
     if include_self:
-        return encoder._encode_one(node)
+        return [node]
 
-    return encoder.encode(node.values_raw())
+    return node.values_raw()
 
 
-def decode(unit, *args, **kwargs):
-    parser = Parser(unit, *args, **kwargs)
-    base_config = Config(getattr(unit, 'name', DEFAULT_STREAM_NAME))
+def encode(node, *args, **kwargs):
+    include_self = kwargs.pop('include_self', False)
+    nodes = _encode_nodes(node, include_self)
 
-    configs = [base_config]
+    return Encoder(*args, **kwargs).encode(nodes)
 
-    def _clean_value(value):
-        if isinstance(value, list):
-            return [_clean_value(x) for x in value
-                    if not isinstance(x, str) or x.strip()]
-        else:
-            value = value.strip()
+
+def encode_to(node, fp, *args, **kwargs):
+    """
+    Encodes `node` like `encode`, writing the output to `fp`
+    in large chunks (see `Encoder.write`).
+    """
+    include_self = kwargs.pop('include_self', False)
+    nodes = _encode_nodes(node, include_self)
+
+    Encoder(*args, **kwargs).write(nodes, fp)
+
+
+def numeric_array(items, kind='array'):
+    """
+    Returns `items` as an `array.array` (or a numpy array if `kind` is
+    'numpy') if they are all ints or floats, otherwise returns `items`.
+    Ints mixed with floats are only stored as floats if they are exact
+    as floats and written back as ints (see `_int_floats`).
+    """
+    typecode = 'q'
+    exact = True
+
+    for item in items:
+        if type(item) is float:
+            typecode = 'd'
+        elif type(item) is not int or not -2 ** 63 <= item < 2 ** 63:
+            return items
+        elif exact and not -2 ** 53 < item < 2 ** 53:
+            exact = False
+
+    if not items or (typecode == 'd' and not exact):
+        return items
+    elif kind == 'numpy':
+        if numpy is None:
+            raise ImportError('numpy is required for numpy arrays')
+
+        return numpy.array(items, dtype='f8' if typecode == 'd' else 'i8')
+
+    return array.array(typecode, items)
+
+
+def clean_value(value, numeric_arrays=None):
+    """
+    Converts a value as parsed into a bool, number or string,
+    recursing into arrays. Arrays of numbers are stored as
+    `numeric_array`s of the given kind, if any.
+    """
+    if isinstance(value, list):
+        value = [clean_value(x, numeric_arrays) for x in value
+                 if not isinstance(x, str) or x.strip()]
+
+        if numeric_arrays:
+            return numeric_array(value, numeric_arrays)
+
+        return value
+    else:
+        value = value.strip()
+
+        try:
+            return bool(['false', 'true'].index(value))
+        except ValueError:
+            pass
+
+        # TODO: Maybe move this to its own function,
+        # as it can be used in the preprocessor's include statement
+        if value and value[0] == '"' and value[-1] == '"':
+            value = value[1:len(value) - 1]
+
+        try:
+            new_val = float(value)
+
+            if new_val.is_integer():
+                new_val = int(new_val)
+
+            return new_val
+        except ValueError:
+            return value
+
+
+class _Selector:
+    SKIP, DESCEND, SELECT = range(3)
+
+    def __init__(self, patterns):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        self._patterns = [
+            [re.compile(fnmatch.translate(x.lower()))
+             for x in pattern.strip('/').split('/')]
+            for pattern in patterns]
+
+    def match(self, path):
+        """
+        Returns SELECT if the class or property at `path` (a tuple of names)
+        is selected, DESCEND if something within it may be, otherwise SKIP.
+        """
+        result = self.SKIP
+        path = [x.lower() for x in path]
+
+        for pattern in self._patterns:
+            if all(x.match(y) for x, y in zip(pattern, path)):
+                if len(path) >= len(pattern):
+                    return self.SELECT
+
+                result = self.DESCEND
+
+        return result
+
+
+_QUERY_PART_RE = re.compile(r'([^\[\]]*)((?:\[[^\]]*\])*)$')
+_QUERY_FILTER_RE = re.compile(r'\[([^\]=]*)(?:=([^\]]*))?\]')
+
+
+def _parse_query(path):
+    """
+    Parses a path as used by `Config.select` into a list of the name
+    (a string, a compiled pattern for globs, or None for `*`) and the
+    filters of each part, where a filter is a key and the value it must
+    have (None if it only has to exist).
+    """
+    parts = []
+
+    for part in path.strip('/').split('/'):
+        match = _QUERY_PART_RE.match(part)
+
+        if match is None or not match.group(1).strip():
+            raise ValueError('Invalid query %r' % path)
+
+        name = match.group(1).strip().lower()
+
+        if name == '*':
+            name = None
+        elif '*' in name or '?' in name:
+            name = re.compile(fnmatch.translate(name))
+
+        filters = [
+            (x.group(1).strip().lower(),
+             None if x.group(2) is None else clean_value(x.group(2)))
+            for x in _QUERY_FILTER_RE.finditer(match.group(2))]
+
+        parts.append((name, filters))
+
+    return parts
+
+
+class _QueryIndex:
+    """
+    Indexes of the classes within a config, used by `Config.select` and
+    `Config.descendants_of`. The parts are built as they are first needed,
+    and the whole is dropped once anything within the tree of the config
+    changes. Changes to classes inherited from outside the tree are not
+    noticed.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._classes = None
+
+        # (id of a config, key) to the values of `key`
+        # in the classes within that config (see `_values`)
+        self._by_key = {}
+
+    def classes(self):
+        """
+        Returns a dict of the lowercased names of the classes within the
+        config to the classes of that name, and a dict of the id of each
+        class to the classes within the config inheriting from it.
+        """
+        if self._classes is None:
+            names = {}
+            children = {}
+            configs = [self.config]
+
+            for config in configs:
+                for node in config._dict.values():
+                    if isinstance(node, Config):
+                        names.setdefault(node.name.lower(), []).append(node)
+
+                        if node.inherits is not None:
+                            children.setdefault(
+                                id(node.inherits), []).append(node)
+
+                        configs.append(node)
+
+            self._classes = names, children
+
+        return self._classes
+
+    def _values(self, config, key):
+        # The keys of the classes in `config` (including inherited ones)
+        # in which `key` is defined, and a dict of each value of `key`
+        # to the keys of the classes with that value, in order
+        index = self._by_key.get((id(config), key))
+
+        if index is not None:
+            return index
+
+        defined = []
+        by_value = {}
+
+        for name, node in config._resolved().items():
+            # Checked first, as checks against Config are slower
+            if isinstance(node, (ValueNode, DeleteNode)):
+                continue
+            elif not isinstance(node, Config):
+                # Compact properties
+                continue
+
+            value = node._dict.get(key)
+
+            if value is None and node.inherits is not None:
+                value = node._resolved().get(key)
+
+            if value is None or isinstance(value, DeleteNode):
+                continue
+            elif isinstance(value, ValueNode):
+                value = value.value
+
+            defined.append(name)
 
             try:
-                return bool(['false', 'true'].index(value))
-            except ValueError:
+                by_value.setdefault(value, []).append(name)
+            except TypeError:
+                # Arrays, which no filter value is equal to
                 pass
 
-            # TODO: Maybe move this to its own function,
-            # as it can be used in the preprocessor's include statement
-            if value and value[0] == '"' and value[-1] == '"':
-                value = value[1:len(value) - 1]
+        index = self._by_key[(id(config), key)] = (defined, by_value)
 
-            try:
-                new_val = float(value)
+        return index
 
-                if new_val.is_integer():
-                    new_val = int(new_val)
+    def filter(self, config, filters):
+        """
+        Returns the keys of the classes in `config` (including inherited
+        ones) matching all of `filters`, in order.
+        """
+        keys = None
+
+        for key, value in filters:
+            defined, by_value = self._values(config, key)
+            found = defined if value is None else by_value.get(value, ())
+
+            if keys is None:
+                keys = found
+            else:
+                found = set(found)
+                keys = [x for x in keys if x in found]
+
+        return keys
+
+
+class _Scopes:
+    """
+    Symbol table of the classes visible at the current point of decoding,
+    resolving the class inherited by `class name : base` without walking
+    up the parents of the class.
+    """
 
-                return new_val
-            except ValueError:
-                return value
+    def __init__(self):
+        # Lowercased name to the classes of that name, innermost last
+        self._symbols = {}
+        self._scopes = [set()]
+
+        # Classes inheriting from a class declared with `class name;`
+        self._deferred = []
+
+    def enter(self):
+        self._scopes.append(set())
+
+    def exit(self):
+        symbols = self._symbols
+
+        for key in self._scopes.pop():
+            configs = symbols[key]
+            configs.pop()
+
+            if not configs:
+                del symbols[key]
+
+    def declare(self, config):
+        key = config.name.lower()
+        scope = self._scopes[-1]
+
+        if key not in scope:
+            scope.add(key)
+            self._symbols.setdefault(key, []).append(config)
+        elif not config.external:
+            # Definition of a class declared before
+            self._symbols[key][-1] = config
+
+    def get(self, name):
+        configs = self._symbols.get(name.lower())
+
+        return configs[-1] if configs else None
+
+    def inherit(self, config):
+        if config.inherits is not None and config.inherits.external:
+            self._deferred.append(config)
+
+    def finish(self):
+        """
+        Points the classes inheriting from a declared class to its
+        definition, if it was defined after they were.
+        """
+        for config in self._deferred:
+            declared = config.inherits
+            defined = declared.parent._dict.get(declared.name.lower())
+
+            if isinstance(defined, Config) and not defined.external:
+                config.inherits = defined
+                config._changed()
+
+        self._deferred = []
+
+
+def decode(unit, *args, lazy=False, select=None, compact=False,
+           numeric_arrays=None, **kwargs):
+    """
+    Decodes `unit` into a `Config`.
+
+    When `lazy` is set, the input is preprocessed in one go, and the body
+    of each class is only decoded once the class is first accessed (see
+    `LazyConfig`). Errors in the body of a class are raised at that point,
+    with positions referring to the preprocessed input.
+
+    `select` limits the output to the classes and properties matching
+    any of the given paths, such as `CfgVehicles/*/displayName`, where
+    each part of the path is a (case insensitive) glob. The bodies of
+    other classes are skipped without being parsed. A selected class
+    still inherits from a class that was not selected, of which the body
+    is then decoded once it is first needed, as with `lazy`. Classes that
+    are only partly selected do not inherit from such classes, which
+    would add the entries that were not selected.
+
+    As with `lazy`, the preprocessed input is held in memory as a whole
+    while decoding (and for as long as lazily decoded classes are left),
+    so memory use grows with the size of the input.
+
+    `compact` stores the values of properties without `ValueNode`s
+    (see `Config.add_value`), and `numeric_arrays` ('array' or 'numpy')
+    stores arrays of numbers in arrays of that kind (see `numeric_array`).
+    """
+    if lazy or select is not None:
+        opts = {k: v for k, v in kwargs.items() if k != 'preprocess'}
+        string = None
+
+        if kwargs.get('preprocess', True):
+            string = PreproBuf(unit, **opts).read()
+
+        parser = TextParser(unit, string=string, lazy=True)
+    elif kwargs.get('preprocess', True) is False and not args:
+        # Nothing to preprocess, so skip the scanner altogether
+        parser = TextParser(unit)
+    else:
+        parser = Parser(unit, *args, **kwargs)
+
+    base_config = Config(getattr(unit, 'name', DEFAULT_STREAM_NAME))
+
+    configs = [base_config]
+    scopes = _Scopes()
+
+    def _add_class(name, inherits, make=Config, *args):
+        # Bodies decoded lazily are decoded after the symbol table is gone,
+        # so classes within them resolve what they inherit by name
+        parent = configs[-1]
+
+        if inherits is not None and scopes is not None:
+            base = scopes.get(inherits)
+
+            if base is None:
+                raise ValueError(
+                    'Attempted to inherit non-existing config (%s)' % inherits)
+
+            inherits = base
+
+        config = make(name, inherits, parent, *args)
+        parent.add(config)
+
+        if scopes is not None:
+            scopes.declare(config)
+            scopes.inherit(config)
+
+        return config
 
     def _decode_iter(iterator):
         for nodetype, nodeargs in iterator:
             if nodetype == NodeType.CLASS:
                 name, inherits, iter_ = nodeargs
-                config = Config(name, inherits, configs[-1])
 
-                configs[-1].add(config)
-                configs.append(config)
+                configs.append(_add_class(name, inherits))
+
+                if scopes is not None:
+                    scopes.enter()
 
                 _decode_iter(iter_)
+
+                if scopes is not None:
+                    scopes.exit()
+            elif nodetype == NodeType.LAZY_CLASS:
+                name, inherits, start = nodeargs
+
+                _add_class(name, inherits, LazyConfig,
+                           functools.partial(_decode_body, start))
+            elif nodetype == NodeType.EXTERN_CLASS:
+                _add_extern(nodeargs[0])
             elif nodetype == NodeType.PROPERTY:
                 name, value = nodeargs
 
-                configs[-1].add(ValueNode(name, _clean_value(value)))
+                configs[-1].add_value(
+                    name, clean_value(value, numeric_arrays), compact)
 
         configs.pop()
 
-    _decode_iter(parser.parse())
+    def _add_extern(name):
+        config = Config(name, None, configs[-1], external=True)
+        configs[-1].add(config)
+
+        if scopes is not None:
+            scopes.declare(config)
+
+    def _decode_body(start, config):
+        depth = len(configs)
+        configs.append(config)
+
+        try:
+            _decode_iter(parser.parse_class(start))
+        finally:
+            # Popped by _decode_iter, unless the body failed to decode
+            del configs[depth:]
+
+    def _skip_class(name, inherits, start):
+        # Declared, but not added to its parent, so that selected classes
+        # can inherit from it
+        if inherits is not None:
+            inherits = scopes.get(inherits)
+
+        config = LazyConfig(name, inherits, configs[-1],
+                            functools.partial(_decode_body, start))
+        scopes.declare(config)
+        skipped.add(id(config))
+
+    def _decode_selected(iterator, path):
+        for nodetype, nodeargs in iterator:
+            name = nodeargs[0]
+            selected = selector.match(path + (name,))
+
+            if selected == selector.SKIP:
+                if nodetype == NodeType.LAZY_CLASS:
+                    _skip_class(*nodeargs)
+
+                continue
+            elif nodetype == NodeType.PROPERTY:
+                if selected == selector.SELECT:
+                    value = clean_value(nodeargs[1], numeric_arrays)
+
+                    configs[-1].add_value(name, value, compact)
+
+                continue
+            elif nodetype == NodeType.EXTERN_CLASS:
+                _add_extern(name)
+
+                continue
+
+            _, inherits, start = nodeargs
+
+            if inherits is not None:
+                base = scopes.get(inherits)
+
+                if base is None or (selected != selector.SELECT
+                                    and id(base) in skipped):
+                    inherits = None
+
+            if selected == selector.SELECT and lazy:
+                _add_class(name, inherits, LazyConfig,
+                           functools.partial(_decode_body, start))
+
+                continue
+
+            configs.append(_add_class(name, inherits))
+            scopes.enter()
+
+            if selected == selector.SELECT:
+                _decode_iter(parser.parse_class(start, lazy=False))
+            else:
+                _decode_selected(parser.parse_class(start), path + (name,))
+
+            scopes.exit()
+
+        configs.pop()
+
+    if select is not None:
+        selector = _Selector(select)
+        skipped = set()
+        _decode_selected(parser.parse(), ())
+    else:
+        _decode_iter(parser.parse())
+
+    scopes.finish()
+    scopes = None
 
     return base_config
 
 
+def iterparse(unit, *args, **kwargs):
+    """
+    Parses `unit` without building a `Config`, yielding a flat sequence
+    of events instead:
+
+    * `EventType.START_CLASS` with the name and inherited name of a class
+    * `EventType.PROPERTY` with the name and value of a property
+    * `EventType.END_CLASS` with the name of the class that ended
+    * `EventType.EXTERN_CLASS` with the name of a class declared
+      without a body (`class name;`)
+
+    The input is read as the events are consumed, so memory use does not
+    grow with the size of the input.
+    """
+    stack = [Parser(unit, *args, **kwargs).parse()]
+    names = []
+
+    while stack:
+        for nodetype, nodeargs in stack[-1]:
+            if nodetype == NodeType.CLASS:
+                name, inherits, iter_ = nodeargs
+
+                yield Event(EventType.START_CLASS, (name, inherits))
+
+                stack.append(iter_)
+                names.append(name)
+
+                break
+            elif nodetype == NodeType.EXTERN_CLASS:
+                yield Event(EventType.EXTERN_CLASS, nodeargs)
+
+                continue
+
+            name, value = nodeargs
+
+            yield Event(EventType.PROPERTY, (name, clean_value(value)))
+        else:
+            stack.pop()
+
+            if names:
+                yield Event(EventType.END_CLASS, (names.pop(),))
+
+
+def _appended(base, node):
+    # The array of `base` (an inherited node, if any) with the items
+    # of the appending `node` added
+    def _items(value):
+        return value.tolist() if hasattr(value, 'tolist') else list(value)
+
+    items = _items(node.value)
+
+    if isinstance(base, ValueNode) and (
+            isinstance(base.value, (list, tuple))
+            or hasattr(base.value, 'tolist')):
+        items = _items(base.value) + items
+
+    return ValueNode(node.name, items)
+
+
 class Config(abc.MutableMapping, dict):
     """
     A `Config` object acts as a proxy to an ordered dict.
@@ -182,6 +982,9 @@ class Config(abc.MutableMapping, dict):
         }
     }
     """
+    __slots__ = ('name', 'parent', 'inherits', 'external', '_dict', '_names',
+                 '_index', '_query_index', '_version', '_tree_version')
+
     @classmethod
     def from_dict(self, name, dict_, **kwargs):
         conf = Config(name, **kwargs)
@@ -191,16 +994,41 @@ class Config(abc.MutableMapping, dict):
 
         return conf
 
-    def __init__(self, name, inherits=None, parent=None):
+    def __init__(self, name, inherits=None, parent=None, external=False):
         self.name = name
         self.parent = parent
 
-        if inherits:
+        # External classes are declared (`class name;`) but not defined
+        self.external = external
+
+        # Bumped on every change to the entries (or base) of this config,
+        # and to anything within the tree of which this config is the root
+        self._version = 0
+        self._tree_version = 0
+
+        if isinstance(inherits, Config) or inherits:
             self.add_inherits(inherits)
         else:
             self.inherits = None
 
-        self._dict = OrderedDict()
+        self._dict = {}
+        self._index = None
+
+        # Names of compact properties not spelled as their (lowercased)
+        # key, see `add_value`
+        self._names = None
+        self._query_index = None
+
+    def _getstate(self):
+        state = {x: getattr(self, x) for x in Config.__slots__}
+        state['_index'] = state['_query_index'] = None
+
+        return state
+
+    def __reduce__(self):
+        # Being a dict subclass, a Config would otherwise be pickled
+        # with its (inherited) items, set before its attributes are
+        return type(self), (self.name,), (None, self._getstate())
 
     def to_dict(self):
         out = {}
@@ -216,7 +1044,7 @@ class Config(abc.MutableMapping, dict):
         return out
 
     def add(self, node, name=None):
-        if isinstance(node, (Config, ValueNode)):
+        if isinstance(node, (Config, ValueNode, DeleteNode)):
             name = node.name
         else:
             if name is None:
@@ -226,25 +1054,272 @@ class Config(abc.MutableMapping, dict):
                 node = Config.from_dict(name, node, parent=self)
             elif isinstance(node, (Config, ValueNode)):
                 node = node
-            elif isinstance(node, (str, int, float, complex, list)):
+            elif isinstance(node, (str, int, float, complex, list,
+                                   array.array)):
                 node = ValueNode(name, node)
             else:
                 raise TypeError(str(type(node)))
 
-        if name in self.iter_self():
-            raise ValueError('%s already defined' % name)
+        existing = self._dict.get(self._keytransform(name))
+
+        if existing is not None:
+            if not (isinstance(node, Config) and isinstance(existing, Config)
+                    and (node.external or existing.external)):
+                raise ValueError('%s already defined' % name)
+            elif node.external:
+                # Declaring a class that is already known
+                return
 
         self[name] = node
 
+    def add_value(self, name, value, compact=False):
+        """
+        Adds the property `name`. When `compact` is set, the value is
+        stored as is instead of in a `ValueNode`, which takes less memory.
+        """
+        key = sys.intern(self._keytransform(name))
+
+        if key in self._dict:
+            raise ValueError('%s already defined' % name)
+
+        if not compact:
+            value = ValueNode(sys.intern(name), value)
+        elif name != key:
+            if self._names is None:
+                self._names = {}
+
+            self._names[key] = sys.intern(name)
+        elif self._names is not None:
+            self._names.pop(key, None)
+
+        self._dict[key] = value
+        self._changed()
+
     def pop(self, key):
+        self._changed()
+
         return self._dict.pop(self._keytransform(key))
 
     def add_inherits(self, inherits):
-        try:
-            self.inherits = self.parent.get_config(inherits)
-        except KeyError:
-            raise ValueError(
-                'Attempted to inherit non-existing config (%s)' % inherits)
+        """
+        Inherits from `inherits`, either a `Config` or the name of a class
+        visible from the parent of this config.
+        """
+        if not isinstance(inherits, Config):
+            try:
+                inherits = self.parent.get_config(inherits)
+            except KeyError:
+                raise ValueError(
+                    'Attempted to inherit non-existing config (%s)' % inherits)
+
+        self.inherits = inherits
+
+        self._changed()
+
+    def _root(self):
+        root = self
+
+        while root.parent is not None:
+            root = root.parent
+
+        return root
+
+    def _changed(self):
+        self._version += 1
+        self._root()._tree_version += 1
+
+    def _resolved(self):
+        """
+        Returns a dict of all keys of the config, including the inherited
+        ones, to their raw nodes. Deleted keys (`delete name;`) are left out.
+
+        The dict is kept along with the version of the config and the index
+        of the config it inherits, and built again once either changes.
+        Classes that add no entries share the dict of their base.
+        """
+        chain = []
+        config = self
+
+        while config is not None:
+            chain.append(config)
+            config = config.inherits
+
+        base = None
+
+        for config in reversed(chain):
+            index = config._index
+
+            if (index is None or index[0] != config._version
+                    or index[1] is not base):
+                # May load a lazy config
+                entries = config._dict
+
+                deleted = [key for key, node in entries.items()
+                           if isinstance(node, DeleteNode)]
+
+                if base is None and not deleted:
+                    resolved = entries
+                elif not entries:
+                    resolved = base[2]
+                else:
+                    resolved = dict(base[2]) if base is not None else {}
+                    resolved.update(entries)
+
+                    for key in deleted:
+                        del resolved[key]
+
+                index = config._index = (config._version, base, resolved)
+
+            base = index
+
+        return base[2]
+
+    def flatten(self):
+        """
+        Returns a copy of the tree, in which every class contains the
+        entries it inherits instead of inheriting them. Deleted classes
+        are left out, arrays appended to (`name[] += {}`) are joined with
+        the arrays they extend, and inherited classes are shared between
+        the classes inheriting them.
+        """
+        flat = {}
+
+        def _flatten(config, parent):
+            result = flat.get(id(config))
+
+            if result is not None:
+                return result
+
+            result = flat[id(config)] = Config(
+                config.name, None, parent, config.external)
+            entries = result._dict
+
+            if config.inherits is not None:
+                base = config.inherits
+
+                entries.update(_flatten(base, flat.get(id(base.parent)))._dict)
+
+            for key, node in config._dict.items():
+                if isinstance(node, Config):
+                    entries[key] = _flatten(node, result)
+                elif isinstance(node, DeleteNode):
+                    entries.pop(key, None)
+                elif isinstance(node, ValueNode) and node.append:
+                    entries[key] = _appended(entries.get(key), node)
+                else:
+                    entries[key] = config._wrap(key, node)
+
+            return result
+
+        return _flatten(self, None)
+
+    def select(self, path):
+        """
+        Returns the classes and properties at `path`, as a dict of their
+        path (a tuple of lowercased names) to their value, in order.
+
+        Each part of `path`, such as `CfgVehicles/*[scope=2]/displayName`,
+        is a (case insensitive) glob matching the entries of the classes
+        matched so far, including inherited entries. A part may be
+        followed by filters, `[key=value]` or `[key]`, limiting it to the
+        classes in which `key` has that value or exists.
+        """
+        matches = {(): self}
+        index = None
+
+        for name, filters in _parse_query(path):
+            found = {}
+
+            if filters and index is None:
+                index = self._get_query_index()
+
+            for prefix, config in matches.items():
+                if not isinstance(config, Config):
+                    continue
+
+                if filters:
+                    # Only classes match filters
+                    keys = index.filter(config, filters)
+                    nodes = config._resolved()
+
+                    if isinstance(name, str):
+                        keys = [x for x in keys if x == name]
+                    elif name is not None:
+                        keys = [x for x in keys if name.match(x)]
+
+                    for key in keys:
+                        found[prefix + (key,)] = nodes[key]
+
+                    continue
+                elif isinstance(name, str):
+                    # Entries of the config itself override inherited ones,
+                    # so these are found without resolving the inherited
+                    node = config._dict.get(name)
+
+                    if node is None and config.inherits is not None:
+                        node = config._resolved().get(name)
+
+                    nodes = ((name, node),) if node is not None else ()
+                elif name is None:
+                    nodes = config._resolved().items()
+                else:
+                    nodes = [x for x in config._resolved().items()
+                             if name.match(x[0])]
+
+                for key, node in nodes:
+                    # Checked in this order as checks against Config,
+                    # an abstract base class, are slower
+                    if isinstance(node, ValueNode):
+                        node = node.value
+                    elif isinstance(node, DeleteNode):
+                        continue
+
+                    found[prefix + (key,)] = node
+
+            matches = found
+
+        return matches
+
+    def descendants_of(self, base):
+        """
+        Returns the classes within this config inheriting from `base`,
+        directly or indirectly, where `base` is a `Config` or the name
+        of classes within this config.
+
+        The classes within this config are indexed by name and by the
+        class they inherit from on first use, until anything in the tree
+        of this config changes.
+        """
+        names, children = self._get_query_index().classes()
+
+        if isinstance(base, Config):
+            bases = [base]
+        else:
+            bases = names.get(base.lower(), [])
+
+        seen = {id(x) for x in bases}
+        found = []
+
+        for config in itertools.chain(bases, found):
+            for child in children.get(id(config), ()):
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    found.append(child)
+
+        return found
+
+    def _get_query_index(self):
+        root = self._root()
+        index = self._query_index
+
+        if (index is not None and index[0] is root
+                and index[1] == root._tree_version):
+            return index[2]
+
+        index = _QueryIndex(self)
+        self._query_index = (root, root._tree_version, index)
+
+        return index
 
     def get_config(self, k):
         k = self._keytransform(k)
@@ -262,32 +1337,43 @@ class Config(abc.MutableMapping, dict):
         return iter(self._dict)
 
     def items_raw(self):
-        for key in self.iter_self():
-            yield key, self._get_raw(key)
+        for key, node in self._dict.items():
+            yield key, self._wrap(key, node)
 
     def values_raw(self):
-        for key in self.iter_self():
-            yield self._get_raw(key)
+        for key, node in self._dict.items():
+            yield self._wrap(key, node)
+
+    def _wrap(self, key, node):
+        # Values of compact properties are stored without their ValueNode
+        if isinstance(node, (Config, ValueNode, DeleteNode)):
+            return node
+        elif self._names is not None:
+            return ValueNode(self._names.get(key, key), node)
+
+        return ValueNode(key, node)
 
     def _get_raw(self, item):
         item = self._keytransform(item)
 
         try:
-            return self._dict[item]
+            node = self._dict[item]
         except KeyError:
-            if self.inherits:
-                return self.inherits._get_raw(item)
+            if self.inherits is not None:
+                return self.inherits._resolved()[item]
 
             raise
 
+        if isinstance(node, DeleteNode):
+            raise KeyError(item)
+
+        return node
+
     def _keytransform(self, key):
         return key.lower()
 
     def __iter__(self):
-        if self.inherits:
-            yield from self.inherits
-
-        yield from self.iter_self()
+        return iter(self._resolved())
 
     def __repr__(self):
         return self._dict.__repr__()
@@ -301,10 +1387,11 @@ class Config(abc.MutableMapping, dict):
         return raw
 
     def __setitem__(self, item, value):
-        if not isinstance(value, (Config, ValueNode)):
+        if not isinstance(value, (Config, ValueNode, DeleteNode)):
             if isinstance(value, dict):
                 conf = Config(item, None, self)
-                self._dict[self._keytransform(item)] = conf
+                self._dict[sys.intern(self._keytransform(item))] = conf
+                self._changed()
 
                 for k, v in value.items():
                     conf[k] = v
@@ -313,10 +1400,54 @@ class Config(abc.MutableMapping, dict):
             else:
                 value = ValueNode(item, value)
 
-        self._dict[self._keytransform(item)] = value
+        self._dict[sys.intern(self._keytransform(item))] = value
+        self._changed()
 
     def __delitem__(self, item):
         del self._dict[self._keytransform(item)]
+        self._changed()
 
     def __len__(self):
         return len(self._dict)
+
+
+class LazyConfig(Config):
+    """
+    A `Config` of which the body is only decoded once it is first needed,
+    by calling `loader` with the config to fill.
+    """
+    __slots__ = ('_loader',)
+
+    def __init__(self, name, inherits, parent, loader):
+        super().__init__(name, inherits, parent)
+
+        # Accessing _dict loads the body, see __getattr__
+        del self._dict
+        self._loader = loader
+
+    @property
+    def loaded(self):
+        return self._loader is None
+
+    def __getattr__(self, name):
+        if name != '_dict' or self.loaded:
+            raise AttributeError(name)
+
+        loader, self._loader = self._loader, None
+        self._dict = {}
+
+        try:
+            loader(self)
+        except BaseException:
+            del self._dict
+            self._loader = loader
+
+            raise
+
+        return self._dict
+
+    def __reduce__(self):
+        # Loaded first, so that it is pickled as a plain Config
+        self._dict
+
+        return Config, (self.name,), (None, self._getstate())
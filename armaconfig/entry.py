@@ -1,5 +1,6 @@
 
 import os
+import re
 import enum
 import collections
 from pathlib import Path
@@ -9,11 +10,9 @@ from .exceptions import (
     UnexpectedType,
     UnexpectedValue
 )
-from .utils import is_identifier_char
+from .utils import is_identifier_char, IDENTIFIER_RE, WHITESPACE_RE
 from .buf import Charbuf, Buf, get_string
-
-# Default name for streams with no `.name` (e.g. StringIO)
-DEFAULT_STREAM_NAME = 'anonymous'
+from .source import DEFAULT_STREAM_NAME, open_source
 
 _Token = collections.namedtuple('Token', [
     'type',
@@ -40,13 +39,35 @@ class Token(_Token):
 
 
 class Streambuf(Charbuf):
+    """
+    Buffer reading from a stack of streams, where the last stream added
+    (e.g. an included file) is read until its end before continuing
+    with the one before it.
+
+    The streams are read in blocks of `CHUNK_SIZE` characters, which are
+    kept in the buffer. Only the characters that have been peeked at count
+    as read, and the line and column of the current stream are counted
+    from those once they are needed. This way `make_token` reports the
+    same position as it would when reading one character at a time.
+    """
     CHAR_TUPLE = collections.namedtuple('CHAR_TUPLE',
                                         ['char', 'line', 'col', 'unit'])
 
-    def __init__(self, stream=None):
+    # Amount of characters read from the underlying stream at a time
+    CHUNK_SIZE = 65536
+
+    def __init__(self, stream=None, include_cache=None):
+        super().__init__()
+
         self.streams = []
+        self.include_cache = include_cache
         self.line_empty = True
 
+        # Index into the buffer up to which characters have been read,
+        # and up to which the position of the stream has been counted
+        self._read_end = 0
+        self._counted = 0
+
         if stream is not None:
             if isinstance(stream, list):
                 for i in stream:
@@ -54,37 +75,60 @@ class Streambuf(Charbuf):
             else:
                 self.add_stream(stream)
 
-    @property
-    def _buf(self):
-        return self.current['buf']
-
     @property
     def current(self):
         return self.streams[-1]
 
+    def resolve_path(self, path):
+        """
+        Returns the path of a file included from the current stream,
+        relative paths being relative to the directory of the stream.
+        """
+        path = Path(path)
+
+        try:
+            current_path = Path(self.current['iowrapper'].name)
+        except (AttributeError, IndexError, TypeError):
+            pass
+        else:
+            if not path.is_absolute():
+                path = current_path.parent.joinpath(path)
+
+        return path
+
+    def open_path(self, path):
+        if self.include_cache is not None:
+            return self.include_cache.open(path)
+
+        return open_source(path)
+
     def add_stream(self, stream):
         if isinstance(stream, (str, os.PathLike)):
-            path = Path(stream)
+            stream = self.open_path(self.resolve_path(stream))
 
-            try:
-                current_path = Path(self.current['iowrapper'].name)
-            except AttributeError:
-                pass
-            else:
-                if not path.is_absolute():
-                    path = current_path.parent.joinpath(stream)
+        if self.streams:
+            self._update_position()
+
+            # Characters that have been read ahead are put aside,
+            # and returned once the new stream has reached its end
+            self.current['buf'] = self._buf[self._offset:self._read_end]
+            self.current['chunk'] = self._buf[self._read_end:]
 
-            stream = open(path)
+            self._buf, self._offset = '', 0
+            self._read_end = self._counted = 0
 
         self.streams.append({
             'iowrapper': stream,
             'line': 0,
             'col': 0,
             'name': getattr(stream, 'name', DEFAULT_STREAM_NAME),
-            'buf': []
+            'buf': '',
+            'chunk': ''
         })
 
     def make_token(self, *args, **kwargs):
+        self._update_position()
+
         stream = self.current
 
         kwargs.setdefault('lineno', stream['line'] + 1)
@@ -93,30 +137,82 @@ class Streambuf(Charbuf):
 
         return Token(*args, **kwargs)
 
-    def __read(self):
+    def _update_position(self):
+        """
+        Moves the line and column of the current stream past the
+        characters that have been read since the last update.
+        """
+        buf, start, end = self._buf, self._counted, self._read_end
+
+        if end <= start:
+            return
+
         stream = self.current
+        newlines = buf.count('\n', start, end)
 
-        char = stream['iowrapper'].read(1)
-        # char_tuple = self.CHAR_TUPLE(char,
-        #                              stream['line'], stream['col'],
-        #                              stream['name'])
+        if newlines:
+            stream['line'] += newlines
+            stream['col'] = end - buf.rindex('\n', start, end) - 1
+        else:
+            stream['col'] += end - start
+
+        self._counted = end
+
+    def _fill_visible(self, length):
+        while self._available() < length:
+            chunk = self.current['iowrapper'].read(self.CHUNK_SIZE)
+
+            if chunk:
+                self._update_position()
+
+                # Drop what has been read before adding the new chunk
+                offset = self._offset
+                self._buf = self._buf[offset:] + chunk
+                self._offset = 0
+                self._read_end -= offset
+                self._counted -= offset
+            elif len(self.streams) > 1:
+                self._read_end = len(self._buf)
+                self._eol_reached()
+            else:
+                return
+
+    def _fill_buf(self, length):
+        self._fill_visible(length)
 
-        stream['col'] += 1
+        end = self._offset + length
+
+        if end > len(self._buf):
+            self._read_end = len(self._buf)
+            self._update_position()
+            self.current['col'] += 1
 
-        if not char:
             self._eol_reached()
 
-            return self.__read()
-        elif char == '\n':
-            stream['line'] += 1
-            stream['col'] = 0
+        self._read_end = max(self._read_end, end)
 
-        return char
+    def read(self):
+        """
+        Reads everything that is left in the buffer and the streams.
+        Included streams are read until their end, and are then
+        followed by the rest of the stream that included them.
+        """
+        chars = []
 
-    def _fill_buf(self, length):
-        chars = [self.__read() for _ in range(length - len(self._buf))]
+        while True:
+            self._buf += self.current['iowrapper'].read()
+            self._read_end = len(self._buf)
+            self._update_position()
+
+            chars.append(self._buf[self._offset:])
+
+            self._buf, self._offset = '', 0
+            self._read_end = self._counted = 0
 
-        self._buf.extend(chars)
+            if len(self.streams) <= 1:
+                break
+
+            self._eol_reached()
 
         return ''.join(chars)
 
@@ -124,19 +220,69 @@ class Streambuf(Charbuf):
         if len(self.streams) <= 1:
             raise EOL()
 
+        # What is left of the ended stream comes before the characters
+        # that were read ahead in the stream that included it
+        leftover = self._buf[self._offset:]
         self.streams.pop()
 
+        stream = self.current
+        self._buf = leftover + stream['buf'] + stream['chunk']
+        self._offset = 0
+        self._read_end = self._counted = len(leftover) + len(stream['buf'])
+
+        stream['buf'] = stream['chunk'] = ''
+
 
 class PreproBuf(Charbuf):
-    def __init__(self, stream, **kwargs):
-        self.stream = Streambuf(stream)
+    def __init__(self, stream, include_cache=None, **kwargs):
+        self.stream = Streambuf(stream, include_cache=include_cache)
         self.preprocessor = Preprocessor(self, **kwargs)
 
         super().__init__()
 
     def _fill_buf(self, length):
-        while len(self._buf) < length:
-            self._buf.extend([x for x in self.preprocessor.process()])
+        while self._available() < length:
+            self._extend(self.preprocessor.process())
+
+    def skip_ws(self):
+        seq = []
+
+        while True:
+            end = WHITESPACE_RE.match(self._buf, self._offset).end()
+
+            seq.append(self._buf[self._offset:end])
+            self._offset = end
+
+            if self._available():
+                return ''.join(seq)
+
+            seq.append(self._skip_source_ws())
+
+            if not self._fill_more():
+                return ''.join(seq)
+
+    def _skip_source_ws(self):
+        # Whitespace is passed through by the preprocessor as is,
+        # so a run of it can be skipped in the source directly
+        return self.stream.skip_ws()
+
+    def read(self):
+        """
+        Preprocesses everything that is left in the stream,
+        returning the output as a single string.
+        """
+        chars = [self._buf[self._offset:]]
+        self._buf, self._offset = '', 0
+
+        while True:
+            chars.append(self._skip_source_ws())
+
+            try:
+                chars.append(self.preprocessor.process())
+            except EOL:
+                break
+
+        return ''.join(chars)
 
     def __getattr__(self, *args, **kwargs):
         return getattr(self.stream, *args, *kwargs)
@@ -149,17 +295,46 @@ class Scanner(Buf):
         UNSPECIFIED = 3
         STRING = 4
 
-    def __init__(self, stream=None, preprocess=True, **kwargs):
+    ENGINES = ('char', 'regex')
+
+    TOKEN_RE = re.compile(r'''
+        (?P<IDENTIFIER>\w+)
+        |(?P<SYMBOL>[=;{}\[\]:])
+        |(?P<STRING>"[^"]*(?:""[^"]*)*")
+        |(?P<UNSPECIFIED>.)
+    ''', re.VERBOSE | re.DOTALL)
+
+    def __init__(self, stream=None, preprocess=True, engine='char', **kwargs):
+        """
+        `engine` selects how the (preprocessed) input is split into tokens:
+
+        * `char` reads the stream one character at a time.
+        * `regex` reads the whole stream up front and tokenizes it with
+          `TOKEN_RE`. When preprocessing, the line and column of the tokens
+          refer to the preprocessed output rather than the source files.
+        """
         if preprocess:
             self.stream = PreproBuf(stream, **kwargs)
         else:
             self.stream = Streambuf(stream)
 
+        if engine == 'char':
+            self._next_raw = self._next_char
+        elif engine == 'regex':
+            self._tokens = self.scan_regex(
+                self.stream.read(), self.stream.current['name'])
+            self._next_raw = self._next_regex
+        else:
+            raise ValueError('Unknown engine %s, expected one of %s' % (
+                repr(engine), ', '.join(self.ENGINES)))
+
         super().__init__()
 
     def _fill_buf(self, length):
-        for _ in range(length - len(self._buf)):
-            self._buf.append(next(self))
+        missing = length - self._available()
+
+        if missing > 0:
+            self._extend([next(self) for _ in range(missing)])
 
     def __next__(self):
         return self.next_token()
@@ -180,10 +355,15 @@ class Scanner(Buf):
         ]
 
     def next_token(self, include_ws=False, expect_typ=None, expect_val=None):
-        try:
-            token = next(self.scan())
-        except StopIteration:
-            raise EOL()
+        while True:
+            try:
+                token = self._next_raw(skip_ws=not include_ws)
+            except StopIteration:
+                raise EOL()
+
+            if (include_ws or token.type != self.Types.UNSPECIFIED
+                    or not token.value.isspace()):
+                break
 
         def _compare_expect(err, expect, got):
             if expect is not None:
@@ -195,22 +375,26 @@ class Scanner(Buf):
                 if not valid:
                     raise err(expect, token)
 
-        if (not include_ws and token.type == self.Types.UNSPECIFIED
-                and token.value.isspace()):
-
-            return self.next_token(include_ws, expect_typ, expect_val)
-
         _compare_expect(UnexpectedType, expect_typ, token.type)
         _compare_expect(UnexpectedValue, expect_val, token.value)
 
         return token
 
+    def _next_char(self, skip_ws=False):
+        if skip_ws:
+            self.stream.skip_ws()
+
+        return next(self.scan())
+
+    def _next_regex(self, skip_ws=False):
+        return next(self._tokens)
+
     def scan(self):
         for char in self.stream:
             if is_identifier_char(char):
                 yield self.stream.make_token(
                     self.Types.IDENTIFIER,
-                    char + self.stream.find_with_cb(is_identifier_char))
+                    char + self.stream.find_re(IDENTIFIER_RE))
 
             elif char in '=;{{}}[]:':
                 yield self.stream.make_token(self.Types.SYMBOL, char)
@@ -220,3 +404,44 @@ class Scanner(Buf):
                     get_string(self.stream))
             else:
                 yield self.stream.make_token(self.Types.UNSPECIFIED, char)
+
+    def scan_regex(self, string, unit=DEFAULT_STREAM_NAME):
+        """
+        Tokenizes `string` with `TOKEN_RE`, yielding the same tokens as
+        `scan` would for the same input.
+
+        The position of a token is that of the stream after the token has
+        been read, which for identifiers and strings includes the one
+        character of lookahead needed to find their end.
+        """
+        types = self.Types
+        length = len(string)
+        line, line_start, counted = 0, 0, 0
+
+        for match in self.TOKEN_RE.finditer(string):
+            typ, value = match.lastgroup, match.group()
+
+            if typ == 'UNSPECIFIED' and value == '"':
+                # Unterminated string
+                raise EOL()
+
+            read = match.end()
+
+            if typ in ('IDENTIFIER', 'STRING'):
+                read += 1
+
+                if typ == 'STRING':
+                    value = value[1:-1].replace('""', '"')
+
+            end = min(read, length)
+
+            if end > counted:
+                newlines = string.count('\n', counted, end)
+
+                if newlines:
+                    line += newlines
+                    line_start = string.rindex('\n', counted, end) + 1
+
+                counted = end
+
+            yield Token(types[typ], value, line + 1, read - line_start, unit)
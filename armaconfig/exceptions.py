@@ -7,10 +7,22 @@ class EOL(IndexError):
     pass
 
 
+def _rebuild(cls, args):
+    exc = cls.__new__(cls)
+    exc.args = args
+
+    return exc
+
+
 class Unexpected(Exception):
     def __init__(self, expected, got):
         super().__init__(format_expected(expected, got, repr(got)))
 
+    def __reduce__(self):
+        # The arguments of __init__ are not kept,
+        # so the exception is rebuilt from its message when unpickled
+        return _rebuild, (type(self), self.args)
+
 
 class UnexpectedType(TypeError, Unexpected):
     def __init__(self, expected, got):
@@ -3,101 +3,561 @@ The preprocessor acts as an optional layer between the main stream,
 and the source.
 """
 
+import io
+import re
 import enum
+import json
+import hashlib
+import operator
+from pathlib import Path
 from .exceptions import Unexpected, UnexpectedValue, UnexpectedType, EOL
-from .utils import is_identifier_char
+from .utils import is_identifier_char, IDENTIFIER_RE
 from .buf import Strbuf, get_string
 
 
-class Define:
-    def __init__(self, preprocessor, name, args, chars):
-        self.name = name
-        self.args = args
-        self.chars = chars
-        self.preprocessor = preprocessor
+# Pieces of a macro body, in order of precedence: string literals are
+# copied verbatim, `##` joins its neighbours, `#name` stringizes.
+BODY_RE = re.compile(
+    r'(?P<string>"[^"]*")|(?P<join>\s*##\s*)|#(?P<stringize>\w+)'
+    r'|(?P<identifier>\w+)')
+RESCAN_RE = re.compile(r'"[^"]*"|\w+')
+
+# Tokens relevant to finding the include guard of a file
+GUARD_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+|//[^\n]*|/\*.*?(?:\*/|\Z))
+    |\#[ \t]*(?P<directive>\w*)(?P<rest>(?:\\\n|[^\n])*)
+    |(?P<other>"[^"]*"?|[^\s/\#"]+|.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def find_include_guard(text):
+    """
+    Returns the macro guarding `text`, if the whole of it is wrapped in
+    an `#ifndef` of a single macro (besides whitespace and comments).
+    """
+    guard = None
+    depth = 0
+
+    for match in GUARD_TOKEN_RE.finditer(text):
+        if match.group('space') is not None:
+            continue
+
+        directive = match.group('directive')
+
+        if guard is None or not depth:
+            # Only the #ifndef may start, and whitespace follow, the guard
+            if guard is not None or directive != 'ifndef':
+                return None
+
+            args = match.group('rest').split()
+
+            if not args:
+                return None
+
+            guard, depth = args[0], 1
+        elif directive in ('if', 'ifdef', 'ifndef'):
+            depth += 1
+        elif directive == 'endif':
+            depth -= 1
+        elif directive in ('else', 'elif') and depth == 1:
+            return None
+
+    return guard if not depth else None
+
+
+# Name of a directive, after its `#`
+DIRECTIVE_RE = re.compile(r'[ \t]*\w*')
+
+DEFINED_RE = re.compile(r'\bdefined\s*(?:\(\s*(\w+)\s*\)|(\w+))')
+LINE_COMMENT_RE = re.compile(r'//.*|/\*.*?\*/')
+EXPRESSION_TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<number>0[xX][0-9a-fA-F]+|\d+)[uUlL]*
+        |(?P<identifier>\w+)
+        |(?P<operator>&&|\|\||<<|>>|<=|>=|==|!=|[-+*/%<>&|^!~?:()])
+        |(?P<invalid>\S)
+    )''', re.VERBOSE)
+
+OPERATIONS = {
+    '|': operator.or_, '^': operator.xor, '&': operator.and_,
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge, '<<': operator.lshift,
+    '>>': operator.rshift, '+': operator.add, '-': operator.sub,
+    '*': operator.mul
+}
+
+# Binary operators of `#if` expressions and their precedence
+BINARY_OPERATORS = {
+    '||': 1, '&&': 2, '|': 3, '^': 4, '&': 5, '==': 6, '!=': 6,
+    '<': 7, '<=': 7, '>': 7, '>=': 7, '<<': 8, '>>': 8,
+    '+': 9, '-': 9, '*': 10, '/': 10, '%': 10
+}
+
+
+class _Expression:
+    """
+    Evaluates the integer expression of an `#if`, in which macros have
+    been expanded. Identifiers that are left evaluate to 0.
+
+    `source` is a token of which the value is the expression,
+    locating it in errors.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = []
+        self.pos = 0
+
+        # Above 0 in operands that are not evaluated, e.g. the right side
+        # of `0 && x`, in which division by zero is not an error
+        self.unevaluated = 0
+
+        for match in EXPRESSION_TOKEN_RE.finditer(source.value.rstrip()):
+            number = match.group('number')
+
+            if number is not None:
+                self.tokens.append(self._number(number))
+            elif match.group('identifier') is not None:
+                self.tokens.append(0)
+            elif match.group('operator') is not None:
+                self.tokens.append(match.group('operator'))
+            else:
+                raise UnexpectedValue('integer expression', source)
 
-    def __call__(self, *args):
-        def resolve_arg(identifier):
-            if identifier not in self.args:
-                return identifier
+    def _number(self, number):
+        try:
+            if number[:2] in ('0x', '0X'):
+                return int(number, 16)
 
-            return args[self.args.index(identifier)]
+            return int(number, 8 if number[0] == '0' else 10)
+        except ValueError:
+            # Such as 09
+            raise UnexpectedValue('octal number', self.source) from None
 
-        def _process_buf(buf):
-            for char in buf:
-                if is_identifier_char(char):
-                    identifier = resolve_arg(
-                        char + buf.find_with_cb(is_identifier_char))
-                    is_joined = False
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
 
-                    while buf.peek(2) == '##':
-                        buf.advance(2)
+    def _take(self, expect=None):
+        token = self._peek()
 
-                        if buf.peek(1) == '#':
-                            break
+        if token is None or (expect is not None and token != expect):
+            raise UnexpectedValue(expect or 'integer expression', self.source)
 
-                        is_joined = True
-                        identifier += resolve_arg(
-                            buf.find_with_cb(is_identifier_char))
+        self.pos += 1
 
-                    if (not is_joined
-                            and identifier in self.preprocessor.defined):
-                        # Check for args tho k chief
-                        def_ = self.preprocessor.defined[identifier]
+        return token
 
-                        yield from def_.resolve(Strbuf(_process_buf(buf)))
+    def evaluate(self):
+        value = self._conditional()
 
-                    else:
-                        yield from iter(identifier)
-                elif char == '#':
-                    # just wrap everything in quotes
-                    yield '"'
-                    yield from _process_buf(buf)
-                    yield '"'
-                else:
-                    yield char
+        if self.pos != len(self.tokens):
+            raise UnexpectedValue('end of expression', self.source)
+
+        return value
+
+    def _conditional(self):
+        condition = self._binary(1)
+
+        if self._peek() != '?':
+            return condition
+
+        self._take()
+        self.unevaluated += not condition
+        if_true = self._conditional()
+        self.unevaluated -= not condition
+
+        self._take(':')
+        self.unevaluated += bool(condition)
+        if_false = self._conditional()
+        self.unevaluated -= bool(condition)
+
+        return if_true if condition else if_false
+
+    def _binary(self, precedence):
+        left = self._unary()
+
+        while True:
+            token = self._peek()
+            token_precedence = BINARY_OPERATORS.get(token)
+
+            if token_precedence is None or token_precedence < precedence:
+                return left
+
+            self._take()
+
+            # The right side of && and || is not evaluated
+            # if the left side decides the result
+            skip = token == '&&' and not left or token == '||' and left
+
+            self.unevaluated += skip
+            right = self._binary(token_precedence + 1)
+            self.unevaluated -= skip
+
+            left = self._apply(token, left, right)
+
+    def _apply(self, token, left, right):
+        if token in ('/', '%'):
+            if not right:
+                if self.unevaluated:
+                    return 0
+
+                raise UnexpectedValue('non-zero divisor', self.source)
+
+            # Truncated towards zero, as in C
+            quotient = abs(left) // abs(right)
+
+            if (left < 0) != (right < 0):
+                quotient = -quotient
+
+            return quotient if token == '/' else left - right * quotient
+        elif token == '&&':
+            return int(bool(left and right))
+        elif token == '||':
+            return int(bool(left or right))
+        elif token in ('<<', '>>') and not 0 <= right < 64:
+            # Undefined in C, and a huge int for large shifts to the left
+            if self.unevaluated:
+                return 0
+
+            raise UnexpectedValue('shift count from 0 to 63', self.source)
+
+        try:
+            return int(OPERATIONS[token](left, right))
+        except (ValueError, OverflowError):
+            raise UnexpectedValue('integer expression', self.source) from None
+
+    def _unary(self):
+        token = self._take()
+
+        if token == '(':
+            value = self._conditional()
+            self._take(')')
+
+            return value
+        elif token == '!':
+            return int(not self._unary())
+        elif token == '~':
+            return ~self._unary()
+        elif token == '-':
+            return -self._unary()
+        elif token == '+':
+            return self._unary()
+        elif isinstance(token, int):
+            return token
+
+        raise UnexpectedValue('integer expression', self.source)
+
+
+def split_args(text, pos):
+    """
+    Split the macro arguments in parentheses starting at `pos` of `text`.
+
+    Returns a tuple of the arguments and the position after the closing
+    parenthesis, or None when `text` does not have a '(' at `pos`.
+    """
+
+    if not text.startswith('(', pos):
+        return None
+
+    args = []
+    depth = 0
+    start = pos = pos + 1
+
+    while pos < len(text):
+        char = text[pos]
+
+        if char == '"':
+            pos = text.find('"', pos + 1)
+
+            if pos == -1:
+                break
+        elif char == '(':
+            depth += 1
+        elif char == ')' and depth:
+            depth -= 1
+        elif char in ',)' and not depth:
+            args.append(text[start:pos])
+            start = pos + 1
 
-        buf = Strbuf(iter(self.chars))
-        expect, got = len(self.args), len(args)
+            if char == ')':
+                return args, start
+
+        pos += 1
+
+    args.append(text[start:])
+
+    return args, len(text)
+
+
+class Define:
+    """
+    A macro, compiled into parts when defined.
+
+    The parts of the body are literal strings, indices of arguments
+    (int) and stringized arguments (a one element tuple of an index).
+    Object-like macros have `args` set to None, and their expansions
+    are cached until the set of defined macros changes.
+    """
+
+    def __init__(self, preprocessor, name, args, chars, parts=None):
+        self.name = name
+        self.args = args
+        self.chars = chars
+        self.preprocessor = preprocessor
+        self.parts = self._compile() if parts is None else parts
+        self._cache = {}
+        self._cache_generation = None
+
+    def bind(self, preprocessor):
+        """
+        Returns a copy of the macro expanded by `preprocessor`,
+        sharing the compiled parts.
+        """
+        return Define(preprocessor, self.name, self.args, self.chars,
+                      self.parts)
+
+    def _compile(self):
+        params = {arg: index for index, arg in enumerate(self.args or ())}
+        parts = []
+        pos = 0
+
+        def append(part):
+            if (isinstance(part, str) and parts
+                    and isinstance(parts[-1], str)):
+                parts[-1] += part
+            elif part != '':
+                parts.append(part)
+
+        for match in BODY_RE.finditer(self.chars):
+            append(self.chars[pos:match.start()])
+            kind, value = match.lastgroup, match.group(match.lastgroup)
+            pos = match.end()
+
+            if kind == 'identifier':
+                append(params.get(value, value))
+            elif kind == 'stringize':
+                append((params[value],) if value in params else '"%s"' % value)
+            elif kind == 'string':
+                append(value)
+
+        append(self.chars[pos:])
+
+        return parts
+
+    def __call__(self, *args, active=frozenset()):
+        expect, got = len(self.args or ()), len(args)
 
         if expect != got:
             raise Exception(
                 f'{repr(self)}: Expected {expect} macro arguments, got {got}')
 
-        return _process_buf(buf)
+        cacheable = not args
 
-    def resolve(self, buf):
-        args = []
-        current = ''
+        if cacheable:
+            if self._cache_generation != self.preprocessor.generation:
+                self._cache = {}
+                self._cache_generation = self.preprocessor.generation
+            elif active in self._cache:
+                return self._cache[active]
 
-        if buf.peek(1) == '(':
-            buf.advance(1)
+        text = ''.join([
+            part if isinstance(part, str)
+            else args[part] if isinstance(part, int)
+            else '"%s"' % args[part[0]]
+            for part in self.parts])
+        value = self.preprocessor.rescan(text, active | {self.name})
 
-            for char in buf:
-                if char in ',)':
-                    args.append(current)
-                    current = ''
+        if cacheable:
+            self._cache[active] = value
 
-                    if char == ')':
-                        break
-                elif is_identifier_char(char):
-                    identifier = char + buf.find_with_cb(is_identifier_char)
+        return value
 
-                    if identifier in self.preprocessor.defined:
-                        stmt = self.preprocessor.defined[identifier]
+    def resolve(self, buf):
+        if self.args is None:
+            return self.__call__()
 
-                        current += ''.join(list(stmt.resolve(buf)))
-                    else:
-                        current += identifier
+        if buf.peek(1) != '(':
+            # Function-like macros are only expanded when called
+            return self.name
+
+        args = []
+        current = ''
+        depth = 0
+        buf.advance(1)
+
+        for char in buf:
+            if char == '"':
+                current += '"%s"' % buf.find_delim('"', advance=True)
+            elif char == '(':
+                depth += 1
+                current += char
+            elif char == ')' and depth:
+                depth -= 1
+                current += char
+            elif char in ',)' and not depth:
+                args.append(current)
+                current = ''
+
+                if char == ')':
+                    break
+            elif is_identifier_char(char):
+                identifier = char + buf.find_re(IDENTIFIER_RE)
+
+                if identifier in self.preprocessor.defined:
+                    stmt = self.preprocessor.defined[identifier]
+
+                    current += stmt.resolve(buf)
                 else:
-                    current += char
+                    current += identifier
+            else:
+                current += char
+
+        if self.args == [] and args == ['']:
+            args = []
 
         return self.__call__(*args)
 
     def __repr__(self):
+        if self.args is None:
+            return f'{type(self).__name__}: {self.name}'
+
         return f'{type(self).__name__}: {self.name}({",".join(self.args)})'
 
 
+class _Defines(dict):
+    """
+    Macros of a preprocessor started from a `MacroEnvironment`.
+
+    The macros of the environment are copied (bound to the preprocessor)
+    once they are first looked up, so that the environment is left as is.
+    Undefining a macro of the environment hides it.
+    """
+
+    def __init__(self, preprocessor, macros):
+        super().__init__()
+        self.preprocessor = preprocessor
+        self.macros = macros
+        self.hidden = set()
+
+    def __missing__(self, name):
+        if name in self.hidden:
+            raise KeyError(name)
+
+        define = self[name] = self.macros[name].bind(self.preprocessor)
+
+        return define
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or (
+            name in self.macros and name not in self.hidden)
+
+    def __setitem__(self, name, define):
+        self.hidden.discard(name)
+        super().__setitem__(name, define)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+
+        self.pop(name, None)
+
+        if name in self.macros:
+            self.hidden.add(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def visible(self):
+        """
+        Returns a dict of all macros that are defined.
+        """
+        defined = {name: define for name, define in self.macros.items()
+                   if name not in self.hidden}
+        defined.update(self)
+
+        return defined
+
+
+class MacroEnvironment:
+    """
+    Immutable set of compiled macros, for preprocessing files that all
+    include the same headers (see `compile_macros`), e.g.
+
+        env = compile_macros('script_macros_common.hpp')
+        config = load(fp, defines=env)
+
+    The file is preprocessed as if it started with those macros defined,
+    which it can redefine or undefine without changing the environment.
+    Headers with an include guard or `#pragma once` that the macros were
+    compiled from are not included again.
+    """
+
+    VERSION = 1
+
+    def __init__(self, macros=(), include_guards=None, included_once=()):
+        # Not bound to any preprocessor
+        self.macros = {x.name: x.bind(None) for x in macros}
+        self.include_guards = dict(include_guards or {})
+        self.included_once = frozenset(included_once)
+        self.digest = hashlib.sha1(self.dumps().encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self.macros)
+
+    def __contains__(self, name):
+        return name in self.macros
+
+    def __iter__(self):
+        return iter(self.macros)
+
+    def __eq__(self, other):
+        if not isinstance(other, MacroEnvironment):
+            return NotImplemented
+
+        return self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        # Identifies the environment, e.g. in the keys of `load_cached`
+        return f'{type(self).__name__}({self.digest})'
+
+    def dumps(self):
+        """
+        Serializes the environment into a string. The paths of the headers
+        it refers to are absolute, so it is only valid where it was made.
+        """
+        return json.dumps({
+            'version': self.VERSION,
+            'macros': [[x.name, x.args, x.chars, x.parts]
+                       for x in self.macros.values()],
+            'include_guards': self.include_guards,
+            'included_once': sorted(self.included_once)
+        })
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Rebuilds an environment serialized with `dumps`.
+        """
+        data = json.loads(data)
+
+        if data.get('version') != cls.VERSION:
+            raise ValueError('Not a macro environment (version %d)' % (
+                cls.VERSION))
+
+        macros = [
+            Define(None, name, args, chars, [
+                tuple(x) if isinstance(x, list) else x for x in parts])
+            for name, args, chars, parts in data['macros']]
+
+        return cls(macros, data['include_guards'], data['included_once'])
+
+
 class Preprocessor:
     class Types(enum.Enum):
         COMMENT = 1
@@ -106,17 +566,52 @@ class Preprocessor:
         INCL_STRING = 4
         UNSPECIFIED = 5
 
-    def __init__(self, buf, **opts):
+    # States of an open conditional (`#if`, `#ifdef`, `#ifndef`):
+    # in the branch that is taken, before it, or after it, and the
+    # latter two once `#else` has been seen, after which the
+    # conditional can only end
+    ACTIVE, PENDING, DONE, ACTIVE_ELSE, DONE_ELSE = range(5)
+
+    def __init__(self, buf, defines=None, **opts):
         self.opts = opts
         self.buf = buf
         self.stream = self.buf.stream
         self.defined = {}
         self.data = []
 
-        # Used for ifdefs
-        # should_return is set to false when in false ifdef statement
-        self._in_ifdef = False
-        self.should_return = True
+        # Resolved paths of included files which are not to be included
+        # again, either because of `#pragma once` or an include guard
+        self._included_once = set()
+        self._include_guards = {}
+
+        if defines is not None:
+            self.defined = _Defines(self, defines.macros)
+            self._included_once.update(defines.included_once)
+            self._include_guards.update(defines.include_guards)
+
+        # Bumped whenever a macro is defined or undefined,
+        # used to invalidate the cached expansions of macros
+        self.generation = 0
+
+        # States of the open conditionals, innermost last. Only the
+        # innermost can be inactive, as inactive branches are skipped
+        # without processing the conditionals within them.
+        self._conditions = []
+
+        # Tokens of the directives that opened them, for errors
+        self._opened = []
+
+    def environment(self):
+        """
+        Returns a `MacroEnvironment` of the macros defined so far.
+        """
+        defined = self.defined
+
+        if isinstance(defined, _Defines):
+            defined = defined.visible()
+
+        return MacroEnvironment(
+            defined.values(), self._include_guards, self._included_once)
 
     def _comp_expect(self, expect, got):
         if expect is not None and expect != got:
@@ -125,28 +620,26 @@ class Preprocessor:
     def _process_command(self):
         _, command = token = self._next(self.Types.IDENTIFIER)
 
-        # if we're in an ifdef, we are searching for else or endif
-        if self._in_ifdef and command in ('else', 'endif'):
-            if command == 'endif':
-                self.should_return = True
-                self._in_ifdef = False
+        if command in ('elif', 'else', 'endif'):
+            if not self._conditions:
+                raise UnexpectedValue(['if', 'ifdef', 'ifndef'], token)
+            elif command == 'endif':
+                self._end_condition()
+            elif self._conditions[-1] == self.ACTIVE_ELSE:
+                raise UnexpectedValue('endif', token)
             else:
-                self.should_return = not self.should_return
-
-            return
-
-        # if we're in an ifdef, and we did not get else or endif,
-        # we return if self.should_return is set to false
-        elif not self.should_return:
-            return
-
+                # The branch that was taken ends
+                self._conditions[-1] = (
+                    self.DONE_ELSE if command == 'else' else self.DONE)
+                self._skip_inactive(at_line_start=False)
         elif command == 'define':
             # add to .defined, return empty
             _, macro = self._next(self.Types.IDENTIFIER)
-            args = []
+            args = None
 
             if self.stream.peek(1) == '(':
                 self.stream.advance(1)
+                args = []
 
                 expect_comma = False
                 for char in self.stream:
@@ -155,14 +648,14 @@ class Preprocessor:
                             raise Unexpected(',', char)
 
                         args.append(
-                            char + self.stream.find_with_cb(is_identifier_char)
+                            char + self.stream.find_re(IDENTIFIER_RE)
                             )
                         expect_comma = True
                     elif char.isspace():
                         continue
                     elif char == ',' and expect_comma:
                         expect_comma = False
-                    elif char == ')' and expect_comma:
+                    elif char == ')' and (expect_comma or not args):
                         break
                     else:
                         raise Unexpected(
@@ -185,6 +678,7 @@ class Preprocessor:
                     chars += char
 
             self.defined[macro] = Define(self, macro, args, chars)
+            self.generation += 1
 
         elif command == 'include':
             # add stream, return empty
@@ -193,34 +687,183 @@ class Preprocessor:
             if all(x in ('"', '>', '<') for x in (path[0], path[-1])):
                 path = path[1:-1]
 
-            path = path.replace('\\', '/')
-
-            self.stream.add_stream(path)
+            self._include(path.replace('\\', '/'))
         elif command in ('ifdef', 'ifndef'):
-            if self._in_ifdef:
-                raise Exception('Nested ifdef/ifndef is not supported')
-
             _, macro = self._next(self.Types.IDENTIFIER)
             is_defined = macro in self.defined
 
-            self.should_return = is_defined if command == 'ifdef' else (
-                not is_defined)
-
-            self._in_ifdef = True
+            self._begin_condition(
+                is_defined if command == 'ifdef' else not is_defined,
+                token, False)
+        elif command == 'if':
+            self._begin_condition(
+                self.evaluate(self._read_line(), token), token, True)
         elif command == 'undef':
             # remove from .defined, return empty
             _, macro = self._next(self.Types.IDENTIFIER)
 
             if macro in self.defined:
                 del self.defined[macro]
+                self.generation += 1
+        elif command == 'pragma':
+            _, pragma = self._next(self.Types.IDENTIFIER)
+
+            if pragma == 'once':
+                name = getattr(self.stream.current['iowrapper'], 'name', None)
+
+                if isinstance(name, str):
+                    self._included_once.add(str(Path(name).resolve()))
+            else:
+                # Other pragmas have no effect
+                self.stream.find_delim('\n', advance=True)
         else:
             raise UnexpectedValue(
-                ['define', 'include', 'ifdef', 'ifndef', 'undef'], token)
+                ['define', 'include', 'if', 'ifdef', 'ifndef', 'elif', 'else',
+                 'endif', 'undef', 'pragma'],
+                token)
+
+    def _read_line(self):
+        # The rest of the line (or of the input), joining lines ending
+        # with a backslash
+        line = self.stream.find_delim('\n', advance=True, to_end=True)
+
+        while line.endswith('\\'):
+            line = line[:-1] + self.stream.find_delim(
+                '\n', advance=True, to_end=True)
+
+        return line
+
+    def evaluate(self, expression, token=None):
+        """
+        Evaluates the expression of an `#if` or `#elif`, returning
+        whether it is true. Errors are located at `token`,
+        the directive, if given.
+        """
+        expression = LINE_COMMENT_RE.sub(' ', expression)
+
+        # Replaced before expanding macros, so that the names are not
+        # expanded themselves
+        expression = DEFINED_RE.sub(
+            lambda m: '1' if (m.group(1) or m.group(2)) in self.defined
+            else '0', expression)
+
+        expression = self.rescan(expression)
+
+        if token is None:
+            token = self.buf.make_token(self.Types.UNSPECIFIED, expression)
+        else:
+            token = type(token).from_token(token, value=expression)
+
+        return bool(_Expression(token).evaluate())
+
+    def _begin_condition(self, condition, token, at_line_start):
+        self._conditions.append(self.ACTIVE if condition else self.PENDING)
+        self._opened.append(token)
+
+        if not condition:
+            self._skip_inactive(at_line_start)
+
+    def _end_condition(self):
+        self._conditions.pop()
+        self._opened.pop()
+
+    def _check_ended(self):
+        # At the end of the input, all conditionals must have ended
+        if self._conditions:
+            raise UnexpectedValue('endif', self._opened[-1])
+
+    def _skip_inactive(self, at_line_start):
+        """
+        Skips an inactive branch of the innermost conditional, up to the
+        branch that is taken or its end. Only `#` characters are looked
+        for, and only the conditional directives they start (at the start
+        of a line) are handled. The directives must not be in a comment.
+        """
+        depth = 0
+
+        while True:
+            try:
+                before = self.stream.find_delim('#', advance=True)
+            except EOL:
+                self._check_ended()
+
+                raise
+
+            newline = before.rfind('\n')
+
+            if newline != -1:
+                at_line_start = not before[newline + 1:].strip()
+            else:
+                at_line_start = at_line_start and not before.strip()
+
+            if not at_line_start:
+                continue
+
+            at_line_start = False
+            directive = self.stream.find_re(DIRECTIVE_RE).strip()
+
+            if directive in ('if', 'ifdef', 'ifndef'):
+                depth += 1
+            elif depth:
+                if directive == 'endif':
+                    depth -= 1
+            elif directive == 'endif':
+                self._end_condition()
+
+                return
+            elif directive in ('else', 'elif'):
+                token = self.buf.make_token(self.Types.IDENTIFIER, directive)
+                state = self._conditions[-1]
+
+                if state == self.DONE_ELSE:
+                    raise UnexpectedValue('endif', token)
+                elif directive == 'else':
+                    if state == self.PENDING:
+                        self._conditions[-1] = self.ACTIVE_ELSE
+
+                        return
+
+                    self._conditions[-1] = self.DONE_ELSE
+                elif state == self.PENDING:
+                    if self.evaluate(self._read_line(), token):
+                        self._conditions[-1] = self.ACTIVE
+
+                        return
+
+                    at_line_start = True
+
+    def _include(self, path):
+        path = self.stream.resolve_path(path)
+        key = str(path.resolve())
+
+        if key in self._included_once:
+            return
+
+        guard = self._include_guards.get(key)
+
+        if guard is None:
+            with self.stream.open_path(path) as fp:
+                text = fp.read()
+
+            # Files without a guard are marked with an empty string,
+            # so that they are not searched for a guard again
+            guard = self._include_guards[key] = find_include_guard(text) or ''
+            stream = io.StringIO(text)
+            stream.name = str(path)
+
+            self.stream.add_stream(stream)
+        elif guard and guard in self.defined:
+            return
+        else:
+            self.stream.add_stream(path)
 
     def _next(self, expect=None):
         def default(payload):
             return self.buf.make_token(self.Types.UNSPECIFIED, payload)
 
+        if expect is not None:
+            self.stream.skip_ws()
+
         char = self.stream.get(1)
 
         try:
@@ -231,8 +874,7 @@ class Preprocessor:
         if char in ('"', '<'):
             if expect == self.Types.INCL_STRING:
                 if char == '<':
-                    value = self.stream.find_with_cb(
-                        lambda x: x != '>', advance=True)
+                    value = self.stream.find_delim('>', advance=True)
                 else:
                     value = get_string(self.stream)
 
@@ -244,8 +886,8 @@ class Preprocessor:
                 # process what is in the string.
                 # We don't use the get_string method,
                 # as that replaces "" with \", which is handled later
-                return default('"%s"' % self.stream.find_with_cb(
-                    lambda x: x != '"', advance=True))
+                return default(
+                    '"%s"' % self.stream.find_delim('"', advance=True))
 
         if char == '/' and (peek in ('/', '*')):
             if peek == '/':
@@ -266,30 +908,74 @@ class Preprocessor:
             # get the identifier, check if it is a macro.
             # if it is a macro, return a token for it,
             # if not, return the default
-            identifier = char + self.stream.find_with_cb(
-                is_identifier_char, advance=False)
+            identifier = char + self.stream.find_re(IDENTIFIER_RE)
 
             if identifier in self.defined or expect == self.Types.IDENTIFIER:
                 return self.buf.make_token(
                     self.Types.IDENTIFIER, identifier)
 
             return default(identifier)
-        elif char.isspace() and expect is not None:
-            return self._next(expect)
         else:
             self._comp_expect(expect, None)
 
             return default(char)
 
+    def rescan(self, text, active=frozenset()):
+        """
+        Expand the macros in the expansion `text` of another macro.
+
+        Macros in `active` are being expanded, and are left as is.
+        """
+
+        parts = []
+        pos = 0
+
+        for match in RESCAN_RE.finditer(text):
+            start, end = match.span()
+            define = self.defined.get(match.group())
+
+            if define is None or start < pos or define.name in active:
+                continue
+
+            args = ()
+
+            if define.args is not None:
+                split = split_args(text, end)
+
+                if split is None:
+                    continue
+
+                args, end = split
+                args = [self.rescan(arg, active) for arg in args]
+
+                if define.args == [] and args == ['']:
+                    args = []
+
+            parts.append(text[pos:start])
+            parts.append(define(*args, active=active))
+            pos = end
+
+        if not parts:
+            return text
+
+        parts.append(text[pos:])
+
+        return ''.join(parts)
+
     def process(self):
-        t, v = nxt = self._next()
+        while True:
+            try:
+                t, v = nxt = self._next()
+            except EOL:
+                self._check_ended()
 
-        if t == self.Types.COMMAND:
-            self._process_command()
+                raise
 
-            return ''
-        elif self.should_return:
-            if t == self.Types.COMMENT:
+            if t == self.Types.COMMAND:
+                self._process_command()
+
+                return ''
+            elif t == self.Types.COMMENT:
                 if self.opts.get('include_commments', False):
                     self.data.append(nxt)
 
@@ -299,13 +985,12 @@ class Preprocessor:
                     return ' '
 
                 # Skip the comment, move to the next one
-                return self.process()
+                continue
             elif t == self.Types.UNSPECIFIED:
                 return v
             elif t == self.Types.IDENTIFIER:
                 if v in self.defined:
-                    return ''.join([x for x in self.defined[v].resolve(
-                        self.stream)])
+                    return self.defined[v].resolve(self.stream)
                 else:
                     return v
 
@@ -316,5 +1001,3 @@ class Preprocessor:
                     self.Types.UNSPECIFIED
                 ],
                 nxt)
-        else:
-            return ''
@@ -0,0 +1,305 @@
+"""
+Reading and writing of rapified (binarized) configs, e.g. `config.bin`.
+
+A rapified config starts with a header, followed by the body of the root
+class. A class body consists of the name of the class it inherits, the
+number of entries and the entries. Subclass entries refer to their body
+by an offset into the file, and the file ends with a (here always empty)
+table of enums.
+"""
+
+import io
+import mmap
+import struct
+from .config import Config, ValueNode, DeleteNode
+
+MAGIC = b'\0raP'
+
+ENTRY_CLASS = 0
+ENTRY_VALUE = 1
+ENTRY_ARRAY = 2
+ENTRY_EXTERN = 3
+ENTRY_DELETE = 4
+ENTRY_ARRAY_APPEND = 5
+
+# Flags of an ENTRY_ARRAY_APPEND entry, for `name[] += {...};`
+APPEND_FLAGS = 1
+
+VALUE_STRING = 0
+VALUE_FLOAT = 1
+VALUE_INT = 2
+VALUE_ARRAY = 3
+VALUE_VARIABLE = 4
+
+_HEADER = struct.Struct('<4sIII')
+_U32 = struct.Struct('<I')
+_FLOAT = struct.Struct('<f')
+_INT = struct.Struct('<i')
+
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _float32(value):
+    # Floats are stored with single precision, so use the shortest
+    # representation that is the same single precision float
+    packed = _FLOAT.pack(value)
+
+    for precision in range(1, 10):
+        shortest = float('%.*g' % (precision, value))
+
+        if _FLOAT.pack(shortest) == packed:
+            break
+
+    if shortest.is_integer():
+        return int(shortest)
+
+    return shortest
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+
+        magic, _, _, _ = _HEADER.unpack_from(data)
+
+        if magic != MAGIC:
+            raise ValueError('Not a rapified config')
+
+    def asciiz(self, pos):
+        end = self.data.find(b'\0', pos)
+
+        if end == -1:
+            raise ValueError('Unterminated string at %d' % pos)
+
+        return self.data[pos:end].decode('utf-8'), end + 1
+
+    def compressed_int(self, pos):
+        value = shift = 0
+
+        while True:
+            byte = self.data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+            if not byte & 0x80:
+                return value, pos
+
+    def read_class(self, config, pos):
+        inherits, pos = self.asciiz(pos)
+
+        if inherits:
+            config.add_inherits(inherits)
+
+        count, pos = self.compressed_int(pos)
+        data = self.data
+
+        for _ in range(count):
+            entry = data[pos]
+            pos += 1
+
+            if entry == ENTRY_CLASS:
+                name, pos = self.asciiz(pos)
+                offset, = _U32.unpack_from(data, pos)
+                pos += _U32.size
+
+                node = Config(name, None, config)
+                config.add(node)
+                self.read_class(node, offset)
+            elif entry == ENTRY_VALUE:
+                kind = data[pos]
+                name, pos = self.asciiz(pos + 1)
+                value, pos = self.read_value(kind, pos)
+
+                config.add(ValueNode(name, value))
+            elif entry in (ENTRY_ARRAY, ENTRY_ARRAY_APPEND):
+                append = entry == ENTRY_ARRAY_APPEND
+
+                if append:
+                    flags, = _U32.unpack_from(data, pos)
+                    pos += _U32.size
+
+                    if flags != APPEND_FLAGS:
+                        raise ValueError('Unknown array flags %d at %d' % (
+                            flags, pos - _U32.size))
+
+                name, pos = self.asciiz(pos)
+                value, pos = self.read_array(pos)
+
+                config.add(ValueNode(name, value, append))
+            elif entry == ENTRY_EXTERN:
+                name, pos = self.asciiz(pos)
+
+                config.add(Config(name, None, config, external=True))
+            elif entry == ENTRY_DELETE:
+                name, pos = self.asciiz(pos)
+
+                config.add(DeleteNode(name))
+            else:
+                raise ValueError('Unknown entry type %d at %d' % (
+                    entry, pos - 1))
+
+        return config
+
+    def read_value(self, kind, pos):
+        if kind in (VALUE_STRING, VALUE_VARIABLE):
+            return self.asciiz(pos)
+        elif kind == VALUE_FLOAT:
+            value, = _FLOAT.unpack_from(self.data, pos)
+
+            return _float32(value), pos + _FLOAT.size
+        elif kind == VALUE_INT:
+            value, = _INT.unpack_from(self.data, pos)
+
+            return value, pos + _INT.size
+        elif kind == VALUE_ARRAY:
+            return self.read_array(pos)
+
+        raise ValueError('Unknown value type %d at %d' % (kind, pos))
+
+    def read_array(self, pos):
+        count, pos = self.compressed_int(pos)
+        items = []
+
+        for _ in range(count):
+            value, pos = self.read_value(self.data[pos], pos + 1)
+            items.append(value)
+
+        return items, pos
+
+
+def loads_bin(data, name='config.bin'):
+    """
+    Reads a config from the rapified `data` (a bytes-like object).
+    """
+    return _Reader(data).read_class(Config(name), _HEADER.size)
+
+
+def load_bin(fp):
+    """
+    Reads a config from the rapified file `fp` (opened in binary mode),
+    memory-mapping it if possible.
+    """
+    name = getattr(fp, 'name', 'config.bin')
+
+    try:
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return loads_bin(fp.read(), name)
+
+    try:
+        return loads_bin(data, name)
+    finally:
+        data.close()
+
+
+class _Writer:
+    def __init__(self):
+        self.out = bytearray(_HEADER.pack(MAGIC, 0, 8, 0))
+
+    def asciiz(self, value):
+        self.out += value.encode('utf-8') + b'\0'
+
+    def compressed_int(self, value):
+        while True:
+            byte = value & 0x7f
+            value >>= 7
+
+            if value:
+                self.out.append(byte | 0x80)
+            else:
+                self.out.append(byte)
+
+                return
+
+    def write_class(self, config):
+        inherits = config.inherits
+
+        self.asciiz(inherits.name if inherits is not None else '')
+        self.compressed_int(len(config))
+
+        # Bodies of subclasses are written after this body,
+        # with the offsets to them filled in once they are written
+        subclasses = []
+
+        for node in config.values_raw():
+            if isinstance(node, Config):
+                if node.external:
+                    self.out.append(ENTRY_EXTERN)
+                    self.asciiz(node.name)
+                else:
+                    self.out.append(ENTRY_CLASS)
+                    self.asciiz(node.name)
+                    subclasses.append((node, len(self.out)))
+                    self.out += _U32.pack(0)
+            elif isinstance(node, DeleteNode):
+                self.out.append(ENTRY_DELETE)
+                self.asciiz(node.name)
+            elif (isinstance(node.value, (list, tuple))
+                    or hasattr(node.value, 'tolist')):
+                if node.append:
+                    self.out.append(ENTRY_ARRAY_APPEND)
+                    self.out += _U32.pack(APPEND_FLAGS)
+                else:
+                    self.out.append(ENTRY_ARRAY)
+
+                self.asciiz(node.name)
+                self.write_array(node.value)
+            else:
+                kind, payload = self.value(node.value)
+
+                self.out += bytes((ENTRY_VALUE, kind))
+                self.asciiz(node.name)
+                self.out += payload
+
+        for node, offset in subclasses:
+            _U32.pack_into(self.out, offset, len(self.out))
+            self.write_class(node)
+
+    def value(self, value):
+        if isinstance(value, str):
+            return VALUE_STRING, value.encode('utf-8') + b'\0'
+        elif (isinstance(value, int)
+                and _INT_MIN <= value <= _INT_MAX):
+            return VALUE_INT, _INT.pack(value)
+        elif isinstance(value, (int, float)):
+            return VALUE_FLOAT, _FLOAT.pack(value)
+
+        raise TypeError(str(type(value)))
+
+    def write_array(self, items):
+        if hasattr(items, 'tolist'):
+            # array.array and numpy arrays
+            items = items.tolist()
+
+        self.compressed_int(len(items))
+
+        for item in items:
+            if isinstance(item, (list, tuple)) or hasattr(item, 'tolist'):
+                self.out.append(VALUE_ARRAY)
+                self.write_array(item)
+            else:
+                kind, payload = self.value(item)
+
+                self.out.append(kind)
+                self.out += payload
+
+
+def dumps_bin(config):
+    """
+    Rapifies `config`, returning the bytes.
+    """
+    writer = _Writer()
+    writer.write_class(config)
+
+    # No enums
+    _U32.pack_into(writer.out, 12, len(writer.out))
+    writer.out += _U32.pack(0)
+
+    return bytes(writer.out)
+
+
+def dump_bin(config, fp):
+    fp.write(dumps_bin(config))
+
+    return fp
@@ -0,0 +1,199 @@
+"""
+Reading of configs given as paths, binary files or bytes.
+
+The bytes are decoded as they are read, in chunks, with the encoding
+detected once from the start of the data. Files opened by path are
+memory-mapped, so that they are not copied into memory as bytes as
+well as decoded.
+"""
+
+import io
+import os
+import mmap
+import codecs
+
+# Default name for streams with no `.name` (e.g. StringIO)
+DEFAULT_STREAM_NAME = 'anonymous'
+
+# Byte order marks and the encoding of the data following them. The
+# UTF-32 marks start with the UTF-16 ones, so they are checked first.
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be')
+]
+
+# Encoding of data that turns out not to be UTF-8
+FALLBACK_ENCODING = 'cp1252'
+
+
+def detect_encoding(data):
+    """
+    Returns the encoding of `data` (at least the first four bytes of it)
+    given by its byte order mark, and the length of the mark.
+    Returns None and 0 if it has no mark.
+    """
+    for bom, encoding in BOMS:
+        if data[:len(bom)] == bom:
+            return encoding, len(bom)
+
+    return None, 0
+
+
+def _newline_decoder(encoding, errors='strict'):
+    # Translates line endings like files opened in text mode do
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+
+    return io.IncrementalNewlineDecoder(decoder, translate=True)
+
+
+class DecodedStream:
+    """
+    Text stream over the bytes-like `data`, such as an mmap, which is
+    decoded as it is read.
+
+    Unless `encoding` is given, it is detected from the byte order mark
+    of the data. Data without one is decoded as UTF-8, unless it turns out
+    not to be UTF-8 before anything but ASCII has been read, in which case
+    it is decoded as CP1252 (`FALLBACK_ENCODING`) instead.
+    """
+
+    def __init__(self, data, name=DEFAULT_STREAM_NAME, encoding=None):
+        self.name = name
+        self.encoding = encoding
+
+        self._data = data
+        self._pos = 0
+
+        if encoding is None:
+            self.encoding, self._pos = detect_encoding(data[:4])
+
+        # Whether the encoding is still to be detected
+        self._detect = self.encoding is None
+        self._errors = 'strict'
+        self._decoder = _newline_decoder(self.encoding or 'utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._data is None
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+        self._data = None
+
+    def read(self, size=-1):
+        """
+        Decodes and returns the next `size` bytes of the data
+        (or all of it), which is at most `size` characters.
+        """
+        if self._data is None:
+            raise ValueError('I/O operation on closed stream')
+
+        while True:
+            start = self._pos
+            end = len(self._data)
+
+            if size is not None and size >= 0:
+                end = min(end, start + size)
+
+            with memoryview(self._data) as view, view[start:end] as chunk:
+                text = self._decode(chunk, end == len(self._data))
+
+            self._pos = end
+
+            # A chunk may end within a character
+            if text or end == len(self._data):
+                return text
+
+    def _decode_chunk(self, chunk, final):
+        if not final or self._decoder.getstate() != (b'', 0):
+            return self._decoder.decode(chunk, final)
+
+        # Nothing is pending, so the rest is decoded at once, without
+        # the incremental decoder joining it to its (empty) buffer first
+        text = str(chunk, self.encoding or 'utf-8', self._errors)
+
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+        return text
+
+    def _decode(self, chunk, final):
+        try:
+            text = self._decode_chunk(chunk, final)
+        except UnicodeDecodeError:
+            if not self._detect:
+                raise
+
+            # Everything read so far was ASCII, so decoding it
+            # as CP1252 instead would not have made a difference. Bytes
+            # still pending in the UTF-8 decoder are decoded again.
+            pending, flag = self._decoder.getstate()
+
+            self.encoding = FALLBACK_ENCODING
+            self._errors = 'replace'
+            self._decoder = _newline_decoder(FALLBACK_ENCODING, 'replace')
+            self._decoder.setstate((b'', flag))
+            self._detect = False
+
+            if pending:
+                chunk = bytes(pending) + chunk
+
+            text = self._decode_chunk(chunk, final)
+
+        if self._detect and not text.isascii():
+            self.encoding = 'utf-8'
+            self._detect = False
+
+        return text
+
+
+def _map(fp):
+    try:
+        if fp.tell() == 0:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        pass
+
+    # Empty files, streams without a file descriptor,
+    # and files that have been read from already
+    return fp.read()
+
+
+def is_binary(source):
+    """
+    Returns whether `source` is something `open_source` decodes,
+    rather than a text stream.
+    """
+    return isinstance(source, (
+        str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap,
+        io.RawIOBase, io.BufferedIOBase))
+
+
+def open_source(source, encoding=None):
+    """
+    Returns a `DecodedStream` of `source`, a path, a file opened in
+    binary mode or bytes-like object. Files are memory-mapped if possible.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as fp:
+            return DecodedStream(_map(fp), str(source), encoding)
+    elif isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        name = getattr(source, 'name', DEFAULT_STREAM_NAME)
+
+        if not isinstance(name, str):
+            name = DEFAULT_STREAM_NAME
+
+        return DecodedStream(_map(source), name, encoding)
+
+    return DecodedStream(source, encoding=encoding)
@@ -0,0 +1,383 @@
+"""
+Binary serialization of parsed `Config` trees, used to cache the result
+of `decode` between runs.
+
+A serialized tree consists of a header, the files the tree was parsed
+from (with their modification time and size), a table of the strings
+used, and the nodes of the tree in pre-order. Names and string values
+refer to the string table by index, and inheritance refers to the index
+of the inherited class among the classes written before it.
+"""
+
+import os
+import sys
+import array
+import struct
+import hashlib
+from pathlib import Path
+from .config import Config, ValueNode, DeleteNode, decode
+from .source import open_source
+
+MAGIC = b'ACFGTREE'
+VERSION = 1
+
+KIND_CLASS = 0
+KIND_INT = 1
+KIND_FLOAT = 2
+KIND_BOOL = 3
+KIND_STRING = 4
+KIND_ARRAY = 5
+KIND_BIGINT = 6
+KIND_EXTERN = 7
+KIND_DELETE = 8
+KIND_DOUBLES = 9
+KIND_LONGS = 10
+
+# Precedes the value of an array appended to (`name[] += {}`)
+KIND_APPEND = 11
+
+_HEADER = struct.Struct('<8sH')
+_COUNT = struct.Struct('<I')
+_DEPENDENCY = struct.Struct('<qQ')
+_NODE = struct.Struct('<BI')
+_CLASS = struct.Struct('<iI')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_BOOL = struct.Struct('<?')
+
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def file_version(path):
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _Writer:
+    def __init__(self):
+        self.strings = {}
+        self.classes = {}
+        self.body = bytearray()
+
+    def string(self, value):
+        try:
+            return self.strings[value]
+        except KeyError:
+            index = self.strings[value] = len(self.strings)
+
+            return index
+
+    def write_class(self, config):
+        inherits = -1
+
+        if config.inherits is not None:
+            try:
+                inherits = self.classes[id(config.inherits)]
+            except KeyError:
+                raise ValueError(
+                    '%s inherits a class outside of the tree' % config.name)
+
+        self.classes[id(config)] = len(self.classes)
+        self.body += _NODE.pack(KIND_CLASS, self.string(config.name))
+        self.body += _CLASS.pack(inherits, len(config))
+
+        for node in config.values_raw():
+            if isinstance(node, Config) and node.external:
+                self.body += _NODE.pack(KIND_EXTERN, self.string(node.name))
+            elif isinstance(node, Config):
+                self.write_class(node)
+            elif isinstance(node, DeleteNode):
+                self.body += _NODE.pack(KIND_DELETE, self.string(node.name))
+            elif node.append:
+                self.body += _NODE.pack(KIND_APPEND, self.string(node.name))
+                self.write_value(node.value)
+            else:
+                self.write_value(node.value, node.name)
+
+    def write_value(self, value, name=None):
+        if isinstance(value, array.array) and value.typecode in 'dq':
+            kind = KIND_DOUBLES if value.typecode == 'd' else KIND_LONGS
+
+            if sys.byteorder == 'big':
+                value = array.array(value.typecode, value)
+                value.byteswap()
+
+            payload = _COUNT.pack(len(value)) + value.tobytes()
+        elif hasattr(value, 'tolist'):
+            # Other arrays, e.g. from numpy
+            return self.write_value(value.tolist(), name)
+        elif isinstance(value, bool):
+            kind, payload = KIND_BOOL, _BOOL.pack(value)
+        elif isinstance(value, int):
+            if _INT_MIN <= value <= _INT_MAX:
+                kind, payload = KIND_INT, _INT.pack(value)
+            else:
+                kind, payload = KIND_BIGINT, _COUNT.pack(
+                    self.string(str(value)))
+        elif isinstance(value, float):
+            kind, payload = KIND_FLOAT, _FLOAT.pack(value)
+        elif isinstance(value, str):
+            kind, payload = KIND_STRING, _COUNT.pack(self.string(value))
+        elif isinstance(value, list):
+            kind, payload = KIND_ARRAY, _COUNT.pack(len(value))
+        else:
+            raise TypeError(str(type(value)))
+
+        if name is None:
+            self.body.append(kind)
+        else:
+            self.body += _NODE.pack(kind, self.string(name))
+
+        self.body += payload
+
+        if kind == KIND_ARRAY:
+            for item in value:
+                self.write_value(item)
+
+
+def dumps_tree(config, dependencies=None):
+    """
+    Serializes `config` into bytes. `dependencies` maps the paths of the
+    files the config was parsed from to their `file_version`.
+    """
+    writer = _Writer()
+    writer.write_class(config)
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION))
+    dependencies = dependencies or {}
+
+    out += _COUNT.pack(len(dependencies))
+
+    for path, (mtime, size) in dependencies.items():
+        encoded = path.encode('utf-8')
+
+        out += _COUNT.pack(len(encoded)) + encoded
+        out += _DEPENDENCY.pack(mtime, size)
+
+    strings = [x.encode('utf-8') for x in writer.strings]
+
+    out += _COUNT.pack(len(strings))
+    out += struct.pack('<%dI' % len(strings), *[len(x) for x in strings])
+    out += b''.join(strings)
+    out += writer.body
+
+    return bytes(out)
+
+
+def _read_dependencies(view):
+    magic, version = _HEADER.unpack_from(view)
+
+    if magic != MAGIC:
+        raise ValueError('Not a serialized config tree')
+    elif version != VERSION:
+        raise ValueError(
+            'Serialized config tree of version %d, expected version %d' % (
+                version, VERSION))
+
+    pos = _HEADER.size
+    count, = _COUNT.unpack_from(view, pos)
+    pos += _COUNT.size
+    dependencies = {}
+
+    for _ in range(count):
+        length, = _COUNT.unpack_from(view, pos)
+        pos += _COUNT.size
+        path = str(view[pos:pos + length], 'utf-8')
+        pos += length
+
+        dependencies[path] = _DEPENDENCY.unpack_from(view, pos)
+        pos += _DEPENDENCY.size
+
+    return dependencies, pos
+
+
+def read_dependencies(data):
+    """
+    Returns the dependencies `data` was serialized with.
+    """
+    return _read_dependencies(memoryview(data))[0]
+
+
+class _Reader:
+    def __init__(self, view, pos):
+        count, = _COUNT.unpack_from(view, pos)
+        pos += _COUNT.size
+        lengths = struct.unpack_from('<%dI' % count, view, pos)
+        pos += 4 * count
+
+        self.strings = strings = []
+
+        for length in lengths:
+            strings.append(str(view[pos:pos + length], 'utf-8'))
+            pos += length
+
+        self.view = view
+        self.pos = pos
+        self.classes = []
+
+    def read_class(self, name, parent):
+        inherits, count = _CLASS.unpack_from(self.view, self.pos)
+        self.pos += _CLASS.size
+
+        config = Config(name, None, parent)
+        self.classes.append(config)
+
+        if inherits >= 0:
+            config.inherits = self.classes[inherits]
+
+        nodes = config._dict
+
+        for _ in range(count):
+            kind, name = _NODE.unpack_from(self.view, self.pos)
+            self.pos += _NODE.size
+            name = self.strings[name]
+
+            if kind == KIND_CLASS:
+                node = self.read_class(name, config)
+            elif kind == KIND_EXTERN:
+                node = Config(name, None, config, external=True)
+            elif kind == KIND_DELETE:
+                node = DeleteNode(name)
+            elif kind == KIND_APPEND:
+                kind = self.view[self.pos]
+                self.pos += 1
+                node = ValueNode(name, self.read_value(kind), True)
+            else:
+                node = ValueNode(name, self.read_value(kind))
+
+            nodes[config._keytransform(name)] = node
+
+        return config
+
+    def read_value(self, kind):
+        view, pos = self.view, self.pos
+
+        if kind == KIND_INT:
+            value, = _INT.unpack_from(view, pos)
+            self.pos += _INT.size
+        elif kind == KIND_FLOAT:
+            value, = _FLOAT.unpack_from(view, pos)
+            self.pos += _FLOAT.size
+        elif kind == KIND_BOOL:
+            value, = _BOOL.unpack_from(view, pos)
+            self.pos += _BOOL.size
+        elif kind in (KIND_DOUBLES, KIND_LONGS):
+            count, = _COUNT.unpack_from(view, pos)
+            value = array.array('d' if kind == KIND_DOUBLES else 'q')
+            end = pos + _COUNT.size + count * value.itemsize
+
+            value.frombytes(view[pos + _COUNT.size:end])
+            self.pos = end
+
+            if sys.byteorder == 'big':
+                value.byteswap()
+        elif kind in (KIND_STRING, KIND_BIGINT, KIND_ARRAY):
+            value, = _COUNT.unpack_from(view, pos)
+            self.pos += _COUNT.size
+
+            if kind == KIND_STRING:
+                value = self.strings[value]
+            elif kind == KIND_BIGINT:
+                value = int(self.strings[value])
+            else:
+                items = []
+
+                for _ in range(value):
+                    item_kind = view[self.pos]
+                    self.pos += 1
+                    items.append(self.read_value(item_kind))
+
+                value = items
+        else:
+            raise ValueError('Unknown node kind %d' % kind)
+
+        return value
+
+
+def loads_tree(data):
+    """
+    Rebuilds a config serialized with `dumps_tree`.
+    """
+    view = memoryview(data)
+    _, pos = _read_dependencies(view)
+    reader = _Reader(view, pos)
+
+    kind, name = _NODE.unpack_from(view, reader.pos)
+    reader.pos += _NODE.size
+
+    if kind != KIND_CLASS:
+        raise ValueError('Expected a class at the root of the tree')
+
+    return reader.read_class(reader.strings[name], None)
+
+
+class _IncludeRecorder:
+    """
+    Include cache recording the versions of the files it opens,
+    reading them through `cache` if given.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.files = {}
+
+    def open(self, path):
+        self.files[str(Path(path).resolve())] = file_version(path)
+
+        if self.cache is not None:
+            return self.cache.open(path)
+
+        return open_source(path)
+
+
+def _is_current(dependencies):
+    try:
+        return all(file_version(path) == tuple(version)
+                   for path, version in dependencies.items())
+    except OSError:
+        return False
+
+
+def load_cached(fp, cache_dir, *args, **kwargs):
+    """
+    Decodes `fp`, reusing the tree cached in `cache_dir` if neither the
+    file nor any of the files it included have changed since.
+    Streams without a file name are decoded as usual.
+    """
+    name = getattr(fp, 'name', None)
+
+    if not isinstance(name, str):
+        return decode(fp, *args, **kwargs)
+
+    source = str(Path(name).resolve())
+    options = repr((source, args, sorted(
+        (k, v) for k, v in kwargs.items() if k != 'include_cache')))
+    cache_path = os.path.join(
+        cache_dir, hashlib.sha1(options.encode('utf-8')).hexdigest())
+
+    try:
+        with open(cache_path, 'rb') as cache_fp:
+            data = cache_fp.read()
+
+        if _is_current(read_dependencies(data)):
+            return loads_tree(data)
+    except (OSError, ValueError, struct.error):
+        pass
+
+    version = file_version(source)
+    recorder = _IncludeRecorder(kwargs.pop('include_cache', None))
+    config = decode(fp, *args, include_cache=recorder, **kwargs)
+
+    dependencies = {source: version}
+    dependencies.update(recorder.files)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+
+    with open(tmp_path, 'wb') as cache_fp:
+        cache_fp.write(dumps_tree(config, dependencies))
+
+    os.replace(tmp_path, cache_path)
+
+    return config
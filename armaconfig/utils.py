@@ -1,4 +1,12 @@
 
+import re
+
+# Matches the rest of an identifier, same as `is_identifier_char`
+IDENTIFIER_RE = re.compile(r'\w*')
+
+WHITESPACE_RE = re.compile(r'\s*')
+
+
 def is_identifier_char(char, first_strict=False):
     if first_strict:
         # If the first in the identifier
@@ -0,0 +1,82 @@
+"""
+Microbenchmarks for the methods of `Buf`/`Charbuf`, run on both a
+`Strbuf` and a `Streambuf`.
+"""
+
+import io
+import sys
+
+from common import generate_config, timed
+from armaconfig.buf import Strbuf
+from armaconfig.entry import Streambuf
+from armaconfig.exceptions import EOL
+from armaconfig.utils import is_identifier_char
+
+
+def _run(method):
+    def wrapper(buf):
+        try:
+            while True:
+                method(buf)
+        except EOL:
+            pass
+
+    return wrapper
+
+
+def _peek_advance(buf):
+    if not buf.peek(1):
+        raise EOL()
+
+    buf.advance(1)
+
+
+def _find_delim(buf):
+    buf.find_delim(';', advance=True)
+
+
+def _find_with_cb(buf):
+    buf.find_with_cb(lambda x: x != ';', advance=True)
+
+
+def _peek_cb(buf):
+    length = len(buf.peek_cb(lambda x: x and x != ';'))
+
+    if not buf.peek(length + 1):
+        raise EOL()
+
+    buf.advance(length + 1)
+
+
+METHODS = {
+    'peek/advance': _run(_peek_advance),
+    'get(1)': _run(lambda buf: buf.get(1)),
+    'get(64)': _run(lambda buf: buf.get(64)),
+    'find_delim': _run(_find_delim),
+    'find_with_cb': _run(_find_with_cb),
+    'peek_cb': _run(_peek_cb),
+    'identifiers': _run(
+        lambda buf: buf.get(1) + buf.find_with_cb(is_identifier_char))
+}
+
+BUFS = {
+    'Strbuf': lambda string: Strbuf(iter(string)),
+    'Streambuf': lambda string: Streambuf(io.StringIO(string))
+}
+
+
+def main(classes=50):
+    string = generate_config(classes)
+
+    print('%d chars' % len(string))
+
+    for buf_name, make_buf in BUFS.items():
+        for name, method in METHODS.items():
+            elapsed = timed(lambda: method(make_buf(string)), repeat=1)
+
+            print('%-10s %-14s %12.0f chars/sec' % (
+                buf_name, name, len(string) / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
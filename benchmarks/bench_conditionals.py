@@ -0,0 +1,44 @@
+"""
+Measures loading a config of which most of the contents are in inactive
+conditional branches, compared with loading the active contents alone.
+
+Usage: python benchmarks/bench_conditionals.py [classes]
+"""
+
+import sys
+
+from common import generate_config, timed
+from armaconfig import loads
+
+
+def generate_conditional(classes):
+    inactive = generate_config(classes)
+
+    return '\n'.join([
+        '#define VERSION 3',
+        '#if VERSION < 2',
+        inactive,
+        '#elif defined(DEBUG)',
+        inactive,
+        '#else',
+        '#ifndef RELEASE',
+        'class active { value = VERSION; };',
+        '#else',
+        inactive,
+        '#endif',
+        '#endif'
+    ])
+
+
+def main(classes=10000):
+    text = generate_conditional(classes)
+
+    assert loads(text) == {'active': {'value': 3}}
+
+    print('%-24s %8.3fs' % ('active contents only', timed(
+        loads, 'class active { value = 3; };')))
+    print('%-24s %8.3fs' % ('with inactive branches', timed(loads, text)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,46 @@
+"""
+Compares `dump`, which writes the output of `Encoder.write` in chunks,
+with writing each fragment generated by `encode`.
+
+Usage: python benchmarks/bench_dump.py [classes]
+"""
+
+import os
+import sys
+import tempfile
+
+from common import generate_config, timed
+from armaconfig import loads, dump, encode
+
+
+def dump_fragments(config, path, **opts):
+    with open(path, 'w') as fp:
+        for x in encode(config, **opts):
+            fp.write(x)
+
+
+def dump_buffered(config, path, **opts):
+    with open(path, 'w') as fp:
+        dump(config, fp, **opts)
+
+
+def main(classes=3000):
+    config = loads(generate_config(classes), preprocess=False)
+    fd, path = tempfile.mkstemp(suffix='.cpp')
+    os.close(fd)
+
+    try:
+        for opts in ({}, {'indent': 4}):
+            for func in (dump_fragments, dump_buffered):
+                elapsed = timed(func, config, path, **opts)
+
+                print('%-16s %-10s %8.3fs' % (
+                    func.__name__,
+                    ', '.join('%s=%s' % x for x in opts.items()) or 'default',
+                    elapsed))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,66 @@
+"""
+Measures the peak memory use of `iterparse` on a large generated config,
+compared to `load` (for small sizes only, as it keeps the whole tree).
+
+Usage: python benchmarks/bench_iterparse.py [megabytes]
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+
+from common import write_config
+from armaconfig import iterparse, load
+
+# Above this size only iterparse is measured
+MAX_LOAD_MEGABYTES = 20
+
+
+def run(mode, path):
+    start = time.perf_counter()
+
+    with open(path) as fp:
+        if mode == 'iterparse':
+            for _ in iterparse(fp):
+                pass
+        else:
+            load(fp)
+
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print('%-12s %10.2fs %10.1f MB peak RSS' % (mode, elapsed, peak))
+
+
+def main(megabytes=500):
+    modes = ['iterparse']
+
+    if megabytes <= MAX_LOAD_MEGABYTES:
+        modes.append('load')
+
+    fd, path = tempfile.mkstemp(suffix='.cpp')
+
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            write_config(fp, megabytes * 1024 * 1024)
+
+        print('%d MB config' % megabytes)
+
+        # Each mode runs in its own process, as the peak RSS only grows
+        for mode in modes:
+            subprocess.run([sys.executable, __file__, '--run', mode, path],
+                           check=True)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(*sys.argv[2:4])
+    else:
+        main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,31 @@
+"""
+Compares the time `loads` takes with the different scanning options.
+"""
+
+import sys
+
+from common import generate_config, timed
+from armaconfig import loads
+
+OPTIONS = [
+    {},
+    {'engine': 'regex'},
+    {'preprocess': False}
+]
+
+
+def main(classes=300):
+    string = generate_config(classes)
+
+    print('%d chars' % len(string))
+
+    for opts in OPTIONS:
+        elapsed = timed(loads, string, **opts)
+
+        print('%-24s %8.3fs' % (
+            ', '.join('%s=%s' % x for x in opts.items()) or 'default',
+            elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""
+Compares loading a pack of files that all include the same macro headers
+with and without a `MacroEnvironment` compiled from the headers.
+
+Usage: python benchmarks/bench_macros.py [files] [macros]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from common import timed
+from armaconfig import load, compile_macros
+
+
+def write_headers(directory, macros):
+    # A header with the common macros, guarded like the CBA ones,
+    # including another one with `#pragma once`
+    with open(os.path.join(directory, 'script_macros_common.hpp'), 'w') as fp:
+        fp.write('#ifndef MAINPREFIX\n#define MAINPREFIX z\n')
+        fp.write('#include "script_version.hpp"\n')
+        fp.write('#define DOUBLES(a,b) a##_##b\n')
+        fp.write('#define TRIPLES(a,b,c) a##_##b##_##c\n')
+        fp.write('#define QUOTE(var) #var\n')
+        fp.write('#define GVAR(var) DOUBLES(PREFIX,var)\n')
+        fp.write('#define QGVAR(var) QUOTE(GVAR(var))\n')
+
+        for i in range(macros):
+            fp.write('#define MACRO_%d(a,b) \\\n' % i)
+            fp.write('    TRIPLES(a,b,%d)\n' % i)
+            fp.write('#define VALUE_%d %d\n' % (i, i))
+
+        fp.write('#endif\n')
+
+    with open(os.path.join(directory, 'script_version.hpp'), 'w') as fp:
+        fp.write('#pragma once\n#define MAJOR 3\n#define MINOR 15\n')
+
+
+def write_pack(directory, files):
+    paths = []
+
+    for i in range(files):
+        path = os.path.join(directory, 'config_%d.cpp' % i)
+
+        with open(path, 'w') as fp:
+            fp.write('#define PREFIX mod_%d\n' % i)
+            fp.write('#include "script_macros_common.hpp"\n')
+            fp.write('class CfgPatches { class GVAR(main) {\n')
+            fp.write('\tname = QGVAR(main);\n')
+            fp.write('\tversion[] = {MAJOR, MINOR, VALUE_%d};\n' % i)
+            fp.write('}; };\n')
+
+        paths.append(path)
+
+    return paths
+
+
+def main(files=500, macros=200):
+    directory = tempfile.mkdtemp()
+
+    try:
+        write_headers(directory, macros)
+        paths = write_pack(directory, files)
+        header = os.path.join(directory, 'script_macros_common.hpp')
+        env = compile_macros(header)
+
+        def _load_all(**kwargs):
+            return [load(path, **kwargs) for path in paths]
+
+        for path in paths[:10]:
+            assert load(path) == load(path, defines=env)
+
+        print('%-28s %8.3fs' % ('without an environment', timed(
+            _load_all, repeat=1)))
+        print('%-28s %8.3fs' % ('compiling the environment', timed(
+            compile_macros, header, repeat=1)))
+        print('%-28s %8.3fs' % ('with the environment', timed(
+            _load_all, defines=env, repeat=1)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,48 @@
+"""
+Measures the memory held by a decoded config tree with tracemalloc,
+with properties stored as `ValueNode`s and without (`compact`),
+and with arrays of numbers stored as `array.array`s.
+
+Usage: python benchmarks/bench_memory.py [classes]
+"""
+
+import sys
+import tracemalloc
+
+from common import generate_config
+from armaconfig import loads
+
+OPTIONS = [
+    {},
+    {'compact': True},
+    {'compact': True, 'numeric_arrays': 'array'}
+]
+
+
+def measure(string, **opts):
+    tracemalloc.start()
+
+    config = loads(string, preprocess=False, **opts)
+    size, _ = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+    del config
+
+    return size
+
+
+def main(classes=5000):
+    string = generate_config(classes)
+
+    print('%d classes, %d chars' % (classes, len(string)))
+
+    for opts in OPTIONS:
+        size = measure(string, **opts)
+
+        print('%-44s %8.1f MB' % (
+            ', '.join('%s=%s' % x for x in opts.items()) or 'default',
+            size / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
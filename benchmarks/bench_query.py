@@ -0,0 +1,109 @@
+"""
+Compares `Config.select` and `Config.descendants_of` with the equivalent
+naive recursion over `Config.__iter__`.
+
+Usage: python benchmarks/bench_query.py [classes]
+"""
+
+import sys
+
+from common import timed
+from armaconfig import loads
+from armaconfig.config import Config
+
+
+def generate_tree(classes):
+    lines = ['class CfgVehicles {', 'class All { scope = 0; };',
+             'class Car_F : All { scope = 1; };',
+             'class Tank_F : All { scope = 1; };']
+
+    for i in range(classes):
+        # Every class inherits from an earlier one,
+        # or from one of the base classes
+        base = ('car_%d' % (i // 2)) if i % 3 else ('Car_F', 'Tank_F')[i % 2]
+
+        lines.append('class car_%d : %s {' % (i, base))
+        lines.append('\tscope = %d;' % (2 if i % 4 else 1))
+        lines.append('\tdisplayName = "Car %d";' % i)
+        lines.append(
+            '\tclass Turrets { class Main { gun = "gun_%d"; }; };' % i)
+        lines.append('};')
+
+    lines.append('};')
+    lines.append('class CfgWeapons {')
+
+    for i in range(classes):
+        lines.append('class gun_%d { displayName = "Gun %d"; };' % (i, i))
+
+    lines.append('};')
+
+    return '\n'.join(lines)
+
+
+def naive_select(config):
+    out = {}
+    vehicles = config['CfgVehicles']
+
+    for name in vehicles:
+        vehicle = vehicles[name]
+
+        if isinstance(vehicle, Config) and vehicle.get('scope') == 2:
+            out[name] = vehicle['displayName']
+
+    return out
+
+
+def naive_descendants(config, base):
+    def _inherits(config):
+        while config.inherits is not None:
+            config = config.inherits
+
+            if config.name.lower() == base:
+                return True
+
+        return False
+
+    def _walk(config):
+        for name in config:
+            value = config[name]
+
+            if isinstance(value, Config):
+                if _inherits(value):
+                    found.append(value)
+
+                _walk(value)
+
+    found = []
+    _walk(config)
+
+    return found
+
+
+def main(classes=5000):
+    config = loads(generate_tree(classes), preprocess=False)
+
+    query = 'CfgVehicles/*[scope=2]/displayName'
+
+    assert len(config.select(query)) == len(naive_select(config))
+
+    def _cold(query):
+        # Changing the tree invalidates the index
+        config['CfgVehicles']['All']['scope'] = 0
+
+        return query()
+
+    print('%-36s %8.3fs' % ('naive select', timed(naive_select, config)))
+    print('%-36s %8.3fs' % ('select (building the index)', timed(
+        _cold, lambda: config.select(query))))
+    print('%-36s %8.3fs' % ('select', timed(config.select, query)))
+
+    print('%-36s %8.3fs' % (
+        'naive descendants', timed(naive_descendants, config, 'car_f')))
+    print('%-36s %8.3fs' % ('descendants_of (building the index)', timed(
+        _cold, lambda: config.descendants_of('car_f'))))
+    print('%-36s %8.3fs' % (
+        'descendants_of', timed(config.descendants_of, 'car_f')))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
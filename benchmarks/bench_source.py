@@ -0,0 +1,63 @@
+"""
+Measures the time and peak memory of reading a large generated config
+through `Streambuf`, as the parsers do, from a file opened in text mode
+and from its path (decoded from a memory map).
+
+The peak resident memory includes the pages of the file that are mapped,
+which unlike memory allocated by Python can be dropped by the system,
+so the peak of the latter is measured with tracemalloc as well.
+
+Usage: python benchmarks/bench_source.py [megabytes]
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+
+from common import write_config
+from armaconfig.entry import Streambuf
+
+
+def run(mode, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    if mode == 'text':
+        with open(path) as fp:
+            Streambuf(fp).read()
+    else:
+        Streambuf(path).read()
+
+    elapsed = time.perf_counter() - start
+    _, traced = tracemalloc.get_traced_memory()
+
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print('%-6s %10.2fs %10.1f MB peak RSS %10.1f MB peak allocated' % (
+        mode, elapsed, peak, traced / 1024 / 1024))
+
+
+def main(megabytes=200):
+    fd, path = tempfile.mkstemp(suffix='.cpp')
+
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            write_config(fp, megabytes * 1024 * 1024)
+
+        for mode in ('text', 'path'):
+            # Separate processes, so that the peaks are measured separately
+            subprocess.run([sys.executable, __file__, mode, path], check=True)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(*sys.argv[1:])
+    else:
+        main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,41 @@
+"""
+Compares reading characters through `Streambuf` one at a time
+(the old behaviour, emulated with `CHUNK_SIZE = 1`) against block reads.
+"""
+
+import io
+import sys
+
+from common import generate_config, timed
+from armaconfig.entry import Streambuf, EOL
+
+
+class CharStreambuf(Streambuf):
+    CHUNK_SIZE = 1
+
+
+def consume(cls, string, length):
+    buf = cls(io.StringIO(string))
+
+    try:
+        while True:
+            buf.get(length)
+    except EOL:
+        pass
+
+
+def main(classes=2000):
+    string = generate_config(classes)
+
+    print('%d chars' % len(string))
+
+    for length in (1, 1024):
+        for cls in (CharStreambuf, Streambuf):
+            elapsed = timed(consume, cls, string, length)
+
+            print('get(%d) %-16s CHUNK_SIZE=%-6d %12.0f chars/sec' % (
+                length, cls.__name__, cls.CHUNK_SIZE, len(string) / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
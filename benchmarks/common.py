@@ -0,0 +1,71 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The benchmarks are meant to be run from the repository root, e.g.
+`python benchmarks/bench_streambuf.py`.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate_config(classes=1000, properties=10, start=0):
+    """
+    Generates a flat (no preprocessor directives) config with `classes`
+    classes, each inheriting from the previous one.
+    The classes are numbered from `start`.
+    """
+    lines = []
+
+    for i in range(start, start + classes):
+        inherits = ' : class_%d' % (i - 1) if i else ''
+
+        lines.append('class class_%d%s {' % (i, inherits))
+
+        for j in range(properties):
+            lines.append('\tnumber_%d = %d;' % (j, i * j))
+            lines.append('\tstring_%d = "value ""%d"" of %d";' % (j, j, i))
+
+        lines.append('\tarray[] = {%s};' % ', '.join(
+            str(x / 2) for x in range(properties)))
+        lines.append('\tclass sub {')
+        lines.append('\t\tdisplayName = "Sub class %d";' % i)
+        lines.append('\t};')
+        lines.append('};')
+
+    return '\n'.join(lines)
+
+
+def write_config(fp, size, classes=100):
+    """
+    Writes a generated config of (at least) `size` characters to `fp`,
+    `classes` classes at a time.
+    """
+    written = start = 0
+
+    while written < size:
+        block = generate_config(classes, start=start) + '\n'
+        fp.write(block)
+
+        written += len(block)
+        start += classes
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    """
+    Returns the best wall clock time of `repeat` runs of `func`.
+    """
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
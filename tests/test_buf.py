@@ -0,0 +1,63 @@
+
+import io
+import pytest
+from armaconfig import loads
+from armaconfig.buf import Strbuf, get_string
+from armaconfig.entry import Streambuf
+from armaconfig.exceptions import EOL
+from armaconfig.utils import IDENTIFIER_RE
+
+
+def test_peek_advance():
+    buf = Strbuf(iter('abcdef'))
+
+    assert buf.peek(3) == 'abc'
+    buf.advance(2)
+    assert buf.peek(2) == 'cd'
+    assert buf.get(3) == 'cde'
+    assert buf.peek(5) == 'f'
+    buf.advance(5)
+    assert buf.peek(1) == ''
+
+    with pytest.raises(EOL):
+        buf.get(1)
+
+
+def test_find():
+    buf = Strbuf(iter('abc;def */ghi'))
+
+    assert buf.find_with_cb(lambda x: x != ';') == 'abc'
+    assert buf.get(1) == ';'
+    assert buf.peek_cb(lambda x: x != ' ') == 'def'
+    assert buf.find_delim('*/', advance=True) == 'def '
+    assert list(buf) == ['g', 'h', 'i']
+
+
+def test_get_string():
+    buf = Strbuf(iter('a ""quoted"" string" rest'))
+
+    assert get_string(buf) == 'a "quoted" string'
+    assert buf.get(5) == ' rest'
+
+
+def test_find_across_chunks(monkeypatch):
+    monkeypatch.setattr(Streambuf, 'CHUNK_SIZE', 3)
+
+    buf = Streambuf(io.StringIO('identifier /* comment */ "a ""b"" c";'))
+
+    assert buf.find_re(IDENTIFIER_RE) == 'identifier'
+    assert buf.find_delim('/*', advance=True) == ' '
+    assert buf.find_delim('*/', advance=True) == ' comment '
+    assert buf.find_with_cb(lambda x: x != '"', advance=True) == ' '
+    assert get_string(buf) == 'a "b" c'
+    assert buf.get(1) == ';'
+
+    with pytest.raises(EOL):
+        buf.find_delim('"')
+
+
+def test_long_string():
+    string = 'word ""quoted"" ' * 10000
+
+    assert loads('long = "%s";' % string) == {
+        'long': string.replace('""', '"').strip()}
@@ -0,0 +1,46 @@
+from armaconfig import load, IncludeCache
+
+
+def test_shared_cache():
+    cache = IncludeCache()
+
+    for _ in range(3):
+        with open('files/test_include_master.hpp') as fp:
+            assert load(fp, include_cache=cache) == {'test': {'a': 3}}
+
+    assert len(cache) == 1
+    assert cache.misses == 1 and cache.hits == 2
+
+
+def test_changed_file(tmp_path):
+    path = tmp_path / 'header.hpp'
+    path.write_text('a = 1;')
+
+    cache = IncludeCache()
+    assert cache.get(path) == 'a = 1;'
+
+    path.write_text('a = 12;')
+    assert cache.get(path) == 'a = 12;'
+    assert cache.misses == 2 and cache.size == len('a = 12;')
+
+
+def test_eviction(tmp_path):
+    cache = IncludeCache(max_size=10)
+
+    for name in ('a', 'b', 'c'):
+        (tmp_path / name).write_text(name * 4)
+
+    cache.get(tmp_path / 'a')
+    cache.get(tmp_path / 'b')
+    cache.get(tmp_path / 'a')
+    cache.get(tmp_path / 'c')
+
+    assert tmp_path / 'a' in cache
+    assert tmp_path / 'b' not in cache
+    assert cache.size == 8
+
+    big = tmp_path / 'big'
+    big.write_text('x' * 11)
+
+    assert cache.get(big) == 'x' * 11
+    assert big not in cache
@@ -1,6 +1,8 @@
 
 import functools
+import pytest
 from armaconfig import loads
+from armaconfig.exceptions import Unexpected
 
 
 def equal_loads(f):
@@ -94,3 +96,146 @@ LIST
         'value_2': 2,
         'value_3': 3
     }
+
+
+@equal_loads
+def test_compiled_macros():
+    test = '''
+#define PREFIX pre
+#define DOUBLES(a,b) a##_##b
+#define GVAR(var) DOUBLES(PREFIX,var)
+#define QUOTE(var) #var
+#define SUM(a,b) a + b
+
+name = QUOTE(GVAR(value));
+other = QUOTE(GVAR(other));
+sum = QUOTE(SUM((1, 2),3));
+    '''
+
+    return test, {
+        'name': 'pre_value',
+        'other': 'pre_other',
+        'sum': '(1, 2) + 3'
+    }
+
+
+@equal_loads
+def test_redefined_macro():
+    test = '''
+#define X 1
+#define Y X
+a = Y;
+#undef X
+#define X 2
+b = Y;
+    '''
+
+    return test, {
+        'a': 1,
+        'b': 2
+    }
+
+
+@equal_loads
+def test_nested_ifdef():
+    test = '''
+#define A
+#ifdef A
+    #ifdef B
+        #define X 1
+    #else
+        #define X 2
+    #endif
+#else
+    #ifdef A
+        #define X 3
+    #endif
+    #define X 4
+#endif
+
+x = X;
+    '''
+
+    return test, {
+        'x': 2
+    }
+
+
+@equal_loads
+def test_if_elif():
+    test = '''
+#define VERSION 3
+#define DEBUG
+
+#if VERSION >= 4
+a = 1;
+#elif VERSION == 3 && defined(DEBUG) && !defined NDEBUG
+a = 2;
+#elif 1
+a = 3;
+#else
+a = 4;
+#endif
+
+#if 0
+b = 1;
+#elif (VERSION * 2 + 1) % 4 == 3 // a comment
+b = 2;
+#endif
+
+#if VERSION > 2 ? UNDEFINED : 1
+c = 1;
+#else
+c = 2;
+#endif
+
+#if 0 && 1 / 0 || 0x10 == 16 \
+    && 010 == 8
+d = 1;
+#endif
+    '''
+
+    return test, {
+        'a': 2,
+        'b': 2,
+        'c': 2,
+        'd': 1
+    }
+
+
+def test_if_errors():
+    with pytest.raises(Unexpected):
+        loads('#endif\n')
+
+    with pytest.raises(Unexpected):
+        loads('#if 1 / 0\n#endif\n')
+
+    with pytest.raises(Unexpected):
+        loads('#if 09\n#endif\n')
+
+    for shift in ('1 << -1', '1 >> 64', '1 << 1000000000'):
+        with pytest.raises(Unexpected):
+            loads('#if %s\n#endif\n' % shift)
+
+    assert loads('#if 0 && 1 << -1\n#else\na = 1;\n#endif\n') == {'a': 1}
+
+    for branches in ('0\n#else\n#elif 1', '1\n#else\n#else',
+                     '0\n#else\n#else', '1\n#elif 1\n#else\n#elif 0'):
+        with pytest.raises(Unexpected):
+            loads('#if %s\n#endif\n' % branches)
+
+
+def test_unterminated_if():
+    with pytest.raises(Unexpected):
+        loads('#if 1\na = 1;\n')
+
+    with pytest.raises(Unexpected):
+        loads('#ifdef X\na = 1;\n#else\n')
+
+    with pytest.raises(Unexpected):
+        loads('#if 0\n#elif 1')
+
+
+@equal_loads
+def test_endif_at_end():
+    return '#if 1\na = 1;\n#endif', {'a': 1}
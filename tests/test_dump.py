@@ -1,5 +1,10 @@
 
-from armaconfig import dumps
+import io
+
+import pytest
+
+from armaconfig import dumps, load, encode, ConfigWriter
+from armaconfig.config import Config, DeleteNode, Encoder
 
 TEST_FILE = 'files/test_config.hpp'
 
@@ -49,3 +54,86 @@ def test_dumps_noindent():
     }
 
     assert dumps(config) == expected
+
+
+def test_dump_buffered():
+    with open(TEST_FILE) as fp:
+        config = load(fp)
+
+    config.add(DeleteNode('deleted'))
+    config.add(Config('external', None, config, external=True))
+
+    for indent in (None, 4):
+        expected = ''.join(encode(config, indent=indent))
+        encoder = Encoder(indent)
+        encoder.BUFFER_FRAGMENTS = 3
+        fp = io.StringIO()
+
+        encoder.write(config.values_raw(), fp)
+
+        assert dumps(config, indent=indent) == expected
+        assert fp.getvalue() == expected
+
+    # One encoder writing to two files in turns
+    encoder = Encoder()
+    encoder.BUFFER_FRAGMENTS = 3
+    files = io.StringIO(), io.StringIO()
+    outs = [], []
+
+    for node in config.values_raw():
+        for fp, out in zip(files, outs):
+            encoder.write_node(node, 0, out, fp)
+
+    for fp, out in zip(files, outs):
+        encoder.flush(out, fp, force=True)
+
+        assert fp.getvalue() == ''.join(encode(config))
+
+
+def _write_entries(writer, config):
+    for node in config.values_raw():
+        if isinstance(node, DeleteNode):
+            writer.delete(node.name)
+        elif not isinstance(node, Config):
+            writer.prop(node.name, node.value)
+        elif node.external:
+            writer.extern_class(node.name)
+        else:
+            inherits = node.inherits
+
+            writer.begin_class(
+                node.name, inherits.name if inherits is not None else None)
+            _write_entries(writer, node)
+            writer.end_class()
+
+
+def test_config_writer():
+    with open(TEST_FILE) as fp:
+        config = load(fp)
+
+    config.add(DeleteNode('deleted'))
+    config.add(Config('external', None, config, external=True))
+    config.add(Config('empty', None, config))
+
+    for indent in (None, 4):
+        fp = io.StringIO()
+
+        with ConfigWriter(fp, indent=indent) as writer:
+            _write_entries(writer, config)
+
+        assert fp.getvalue() == dumps(config, indent=indent)
+
+
+def test_config_writer_unended():
+    writer = ConfigWriter(io.StringIO())
+    writer.begin_class('CfgVehicles')
+    writer.prop('array', (1, 2.5, 'a'))
+
+    with pytest.raises(ValueError):
+        writer.close()
+
+    writer.end_class()
+    writer.close()
+
+    with pytest.raises(ValueError):
+        writer.end_class()
@@ -0,0 +1,49 @@
+from armaconfig import load, IncludeCache
+from armaconfig.preprocessor import find_include_guard
+
+
+def load_main(tmp_path, header, cache):
+    (tmp_path / 'header.hpp').write_text(header)
+    (tmp_path / 'main.hpp').write_text(
+        '#include "header.hpp"\n'
+        '#include "header.hpp"\n'
+        'class test { value = VALUE; };\n'
+        '#include "header.hpp"\n')
+
+    with open(tmp_path / 'main.hpp') as fp:
+        return load(fp, include_cache=cache)
+
+
+def test_include_guard(tmp_path):
+    cache = IncludeCache()
+    header = '''// Header
+#ifndef HEADER_HPP
+#define HEADER_HPP
+#define VALUE 3
+property = VALUE;
+#endif
+'''
+
+    assert load_main(tmp_path, header, cache) == {
+        'property': 3, 'test': {'value': 3}}
+    assert cache.misses == 1 and cache.hits == 0
+
+
+def test_pragma_once(tmp_path):
+    cache = IncludeCache()
+    header = '#pragma once\n#define VALUE 3\nproperty = VALUE;\n'
+
+    assert load_main(tmp_path, header, cache) == {
+        'property': 3, 'test': {'value': 3}}
+    assert cache.misses == 1 and cache.hits == 0
+
+
+def test_find_include_guard():
+    assert find_include_guard(
+        '/* a */\n#ifndef A\n#define A\n#endif // A\n') == 'A'
+    assert find_include_guard('#ifndef A\n#define Q(x) #x\n#endif') == 'A'
+    assert find_include_guard('x = 1;\n#ifndef A\n#endif') is None
+    assert find_include_guard('#ifndef A\n#endif\nx = 1;') is None
+    assert find_include_guard('#ifndef A\n#else\n#endif') is None
+    assert find_include_guard('#ifdef A\n#endif') is None
+    assert find_include_guard('#ifndef A\n') is None
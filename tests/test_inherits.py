@@ -0,0 +1,121 @@
+import pytest
+from armaconfig import loads, dumps
+from armaconfig.config import Config, DeleteNode
+
+TEST = '''
+class Base { a = 1; b = 2; class Sub { c = 3; }; };
+class Child: Base { b = 4; d = 5; };
+class GrandChild: Child { e = 6; };
+'''
+
+
+def test_resolved_keys():
+    config = loads(TEST)
+    grandchild = config['GrandChild']
+
+    assert list(grandchild) == ['a', 'b', 'sub', 'd', 'e']
+    assert grandchild['b'] == 4 and grandchild['sub']['c'] == 3
+
+    config['Base']['f'] = 7
+    config['Child'].add(8, 'g')
+    assert grandchild['f'] == 7 and grandchild['g'] == 8
+
+    del config['Child']['b']
+    assert grandchild['b'] == 2
+
+    config['Base'].pop('a')
+    assert 'a' not in list(grandchild)
+
+
+def test_resolved_keys_kept():
+    config = loads(TEST)
+    grandchild = config['GrandChild']
+    resolved = grandchild._resolved()
+
+    # Changes to other configs keep the index
+    config['Other'] = {'a': 1}
+    config['Base']['Sub']['c'] = 4
+
+    assert grandchild._resolved() is resolved
+
+    config['Base']['a'] = 2
+
+    assert grandchild._resolved() is not resolved
+    assert grandchild['a'] == 2
+
+
+def test_flatten():
+    config = loads(TEST)
+    config['GrandChild'].add(DeleteNode('Sub'))
+    flat = config.flatten()
+
+    assert flat.to_dict() == {
+        'base': {'a': 1, 'b': 2, 'sub': {'c': 3}},
+        'child': {'a': 1, 'b': 4, 'sub': {'c': 3}, 'd': 5},
+        'grandchild': {'a': 1, 'b': 4, 'd': 5, 'e': 6}
+    }
+    assert all(isinstance(x, Config) and x.inherits is None
+               for x in flat.values())
+    assert flat['child']['sub'] is flat['base']['sub']
+    assert config['Child'].inherits is config['Base']
+
+
+def test_delete():
+    config = loads(TEST)
+    grandchild = config['GrandChild']
+    grandchild.add(DeleteNode('Sub'))
+    grandchild.add(DeleteNode('Missing'))
+
+    with pytest.raises(KeyError):
+        grandchild['sub']
+
+    assert 'sub' not in grandchild and 'missing' not in grandchild
+    assert list(grandchild) == ['a', 'b', 'd', 'e']
+    assert grandchild.to_dict() == config.flatten()['grandchild'].to_dict()
+    assert config.select('GrandChild/*') == {
+        ('grandchild', x): grandchild[x] for x in grandchild}
+
+    # Kept as entries, so that they are written out
+    assert list(grandchild.values_raw())[-2:] == [
+        DeleteNode('Sub'), DeleteNode('Missing')]
+    assert dumps(grandchild, include_self=True).endswith(
+        'delete Sub;delete Missing;};')
+
+
+EXTERN = '''
+class Base;
+class Outer { class Base { a = 1; }; class Child: Base {}; };
+class Child: Base { b = 2; };
+class Base { c = 3; };
+class Deep { class Inner { class Child: Child {}; }; };
+class Unknown;
+class Other: Unknown {};
+'''
+
+
+def test_extern_classes():
+    for kwargs in ({}, {'preprocess': False}, {'lazy': True}, {'select': '*'}):
+        config = loads(EXTERN, **kwargs)
+
+        assert list(config) == [
+            'base', 'outer', 'child', 'deep', 'unknown', 'other']
+        assert config['Child'].inherits is config['Base']
+        assert config['Outer']['Child'].to_dict() == {'a': 1}
+        assert config['Deep']['Inner']['Child'].to_dict() == {'c': 3, 'b': 2}
+        assert config['Other'].inherits is config['Unknown']
+        assert config['Unknown'].external
+
+    assert dumps(config) == (
+        'class Base {c = 3;};'
+        'class Outer {class Base {a = 1;};class Child : Base {};};'
+        'class Child : Base {b = 2;};'
+        'class Deep {class Inner {class Child : Child {};};};'
+        'class Unknown;class Other : Unknown {};')
+
+
+def test_empty_base():
+    config = loads('class A { a = 1; }; class B: A {}; class C: B {};')
+
+    assert config['C']['a'] == 1
+    assert dumps(config) == (
+        'class A {a = 1;};class B : A {};class C : B {};')
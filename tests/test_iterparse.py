@@ -0,0 +1,40 @@
+import io
+from armaconfig import iterparse
+from armaconfig.analyse import EventType
+
+
+def test_events():
+    string = '''
+#define VALUE 2
+a = 1;
+class A {
+    b[] = {1, "x", {true}};
+    class B: A { c = VALUE; };
+    class C {};
+};
+d = "text";
+'''
+    events = [(e.type, e.args) for e in iterparse(io.StringIO(string))]
+
+    assert events == [
+        (EventType.PROPERTY, ('a', 1)),
+        (EventType.START_CLASS, ('A', None)),
+        (EventType.PROPERTY, ('b', [1, 'x', [True]])),
+        (EventType.START_CLASS, ('B', 'A')),
+        (EventType.PROPERTY, ('c', 2)),
+        (EventType.END_CLASS, ('B',)),
+        (EventType.START_CLASS, ('C', None)),
+        (EventType.END_CLASS, ('C',)),
+        (EventType.END_CLASS, ('A',)),
+        (EventType.PROPERTY, ('d', 'text')),
+    ]
+
+
+def test_config_file():
+    with open('files/test_config.hpp') as fp:
+        events = list(iterparse(fp))
+
+    starts = [e for e in events if e.type == EventType.START_CLASS]
+    ends = [e for e in events if e.type == EventType.END_CLASS]
+
+    assert len(starts) == len(ends) > 0
@@ -0,0 +1,73 @@
+import pickle
+import pytest
+from armaconfig import load, loads
+from armaconfig.config import LazyConfig
+from armaconfig.exceptions import UnexpectedType
+
+TEST = '''
+#define VALUE 3
+class CfgPatches { class Mod { units[] = {"a", "b"}; value = VALUE; }; };
+class Base { text = "with } and { in it"; array[] = {{1}, {}}; };
+class Child: Base { class Nested: Base {}; };
+'''
+
+
+def test_lazy_matches_eager():
+    with open('files/test_config.hpp') as fp:
+        eager = load(fp)
+
+    with open('files/test_config.hpp') as fp:
+        lazy = load(fp, lazy=True)
+
+    assert lazy.to_dict() == eager.to_dict()
+    assert loads(TEST, lazy=True).to_dict() == loads(TEST).to_dict()
+
+
+def test_loaded_on_access():
+    config = loads(TEST, lazy=True)
+    patches, base = config['CfgPatches'], config['Base']
+
+    assert isinstance(patches, LazyConfig) and not patches.loaded
+    assert patches['Mod']['value'] == 3
+    assert patches.loaded and not base.loaded
+
+    child = config['Child']
+    assert child['text'] == 'with } and { in it'
+    assert base.loaded and child['Nested'].inherits is base
+
+
+def test_error_on_access():
+    config = loads('class A { x = 1; ;; }; class B { y = 2; };', lazy=True)
+
+    assert config['B']['y'] == 2
+
+    with pytest.raises(UnexpectedType):
+        config['A']['x']
+
+    assert not config['A'].loaded
+
+
+def test_load_after_error():
+    config = loads(
+        'class A { x = 1; class Inner { ;; }; }; '
+        'class B { class Inner { y = 2; }; z = 3; };', lazy=True)
+
+    with pytest.raises(UnexpectedType):
+        config['A']['Inner']['x']
+
+    assert config['B'].to_dict() == {'inner': {'y': 2}, 'z': 3}
+    assert config['B']['Inner'].parent is config['B']
+
+    # Failed loads can be retried, with the same result
+    with pytest.raises(UnexpectedType):
+        config['A']['Inner']['y']
+
+    assert config['A']['x'] == 1 and list(config) == ['a', 'b']
+
+
+def test_pickle():
+    config = loads(TEST, lazy=True)
+    read = pickle.loads(pickle.dumps(config))
+
+    assert type(read['Child']) is not LazyConfig
+    assert read.to_dict() == loads(TEST).to_dict()
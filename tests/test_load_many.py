@@ -0,0 +1,67 @@
+import os
+import pickle
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from armaconfig import load_many, loads
+from armaconfig.exceptions import UnexpectedType
+
+
+def test_load_many(tmp_path):
+    paths = []
+
+    for i in range(6):
+        path = tmp_path / ('config_%d.cpp' % i)
+        path.write_text('class A { x = %d; };\nclass B: A { y = 1; };' % i)
+        paths.append(path)
+
+    paths[3].write_text('class A { x = 1; };;')
+
+    for workers in (1, 2):
+        configs = load_many(paths, workers=workers)
+
+        assert list(configs) == paths
+        assert isinstance(configs[paths[3]], UnexpectedType)
+
+        for i in (0, 1, 2, 4, 5):
+            config = configs[paths[i]]
+
+            assert config == {'a': {'x': i}, 'b': {'x': i, 'y': 1}}
+            assert config['B'].inherits is config['A']
+
+
+class _CrashingCache:
+    def open(self, path):
+        # As if the worker crashed
+        os._exit(1)
+
+
+def test_load_many_crash(tmp_path):
+    paths = []
+
+    for i in range(4):
+        path = tmp_path / ('config_%d.cpp' % i)
+        path.write_text('x = %d;' % i)
+        paths.append(path)
+
+    paths[1].write_text('#include "header.hpp"\n')
+    configs = load_many(paths, workers=2, include_cache=_CrashingCache())
+
+    assert list(configs) == paths
+    assert isinstance(configs[paths[1]], BrokenProcessPool)
+
+    for i in (0, 2, 3):
+        assert (configs[paths[i]] == {'x': i}
+                or isinstance(configs[paths[i]], BrokenProcessPool))
+
+
+def test_pickle():
+    config = loads('class A { x[] = {1, "a"}; };\nclass B: A {};')
+
+    assert pickle.loads(pickle.dumps(config)).to_dict() == config.to_dict()
+
+    with pytest.raises(UnexpectedType) as e:
+        loads('class A {};;')
+
+    error = pickle.loads(pickle.dumps(e.value))
+
+    assert type(error) is UnexpectedType and error.args == e.value.args
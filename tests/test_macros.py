@@ -0,0 +1,62 @@
+import io
+import pickle
+from armaconfig import load, loads, compile_macros, MacroEnvironment
+from armaconfig import IncludeCache
+
+
+def write_headers(tmp_path):
+    (tmp_path / 'macros.hpp').write_text(
+        '#ifndef MACROS_HPP\n'
+        '#define MACROS_HPP\n'
+        '#include "version.hpp"\n'
+        '#define DOUBLES(a,b) a##_##b\n'
+        '#define GVAR(var) DOUBLES(PREFIX,var)\n'
+        '#define QUOTE(var) #var\n'
+        '#endif\n')
+    (tmp_path / 'version.hpp').write_text(
+        '#pragma once\n#define VERSION 3\n')
+    (tmp_path / 'main.cpp').write_text(
+        '#include "macros.hpp"\n'
+        '#include "version.hpp"\n'
+        'name = QUOTE(GVAR(main));\n'
+        'version = VERSION;\n')
+
+
+def test_compile_macros(tmp_path):
+    write_headers(tmp_path)
+    env = compile_macros(
+        tmp_path / 'macros.hpp', io.StringIO('#define PREFIX mod\n'))
+
+    assert sorted(env) == [
+        'DOUBLES', 'GVAR', 'MACROS_HPP', 'PREFIX', 'QUOTE', 'VERSION']
+
+    # The headers are not included again
+    cache = IncludeCache()
+    config = load(tmp_path / 'main.cpp', defines=env, include_cache=cache)
+
+    assert config == {'name': 'mod_main', 'version': 3}
+    assert cache.misses == 0
+
+    env = MacroEnvironment.loads(env.dumps())
+
+    assert load(tmp_path / 'main.cpp', defines=env) == config
+    assert pickle.loads(pickle.dumps(env)) == env
+
+
+def test_environment_unchanged():
+    env = compile_macros(io.StringIO(
+        '#define A 1\n#define B A\n#define C(x) x\n'))
+    test = '''
+a = B;
+#undef A
+#define A 2
+b = B;
+#undef C
+#ifdef C
+c = 1;
+#endif
+    '''
+
+    assert loads(test, defines=env) == {'a': 1, 'b': 2}
+    assert loads('a = B; c = C(4);', defines=env) == {'a': 1, 'c': 4}
+    assert sorted(env) == ['A', 'B', 'C']
@@ -0,0 +1,90 @@
+import pytest
+
+from armaconfig import loads
+from armaconfig.config import DeleteNode
+
+TEST = '''
+class CfgVehicles {
+    class All { scope = 0; };
+    class Car_F: All {
+        scope = 1;
+        displayName = "Car";
+        class Turrets { class Main {}; };
+    };
+    class Hatchback: Car_F { scope = 2; displayName = "Hatchback"; };
+    class Hatchback_Sport: Hatchback {};
+    class Tank_F: All { scope = 2; displayName = "Tank"; };
+};
+class CfgWeapons { class Car_F {}; class Rifle: Car_F {}; };
+'''
+
+
+def test_select():
+    config = loads(TEST)
+    config['CfgVehicles']['Hatchback_Sport'].add(DeleteNode('Turrets'))
+
+    assert config.select('CfgVehicles/*[scope=2]/displayName') == {
+        ('cfgvehicles', 'hatchback', 'displayname'): 'Hatchback',
+        ('cfgvehicles', 'hatchback_sport', 'displayname'): 'Hatchback',
+        ('cfgvehicles', 'tank_f', 'displayname'): 'Tank'
+    }
+    assert list(config.select('/cfgvehicles/hatch*/')) == [
+        ('cfgvehicles', 'hatchback'), ('cfgvehicles', 'hatchback_sport')]
+    assert list(config.select('CfgVehicles/*/Turrets/*')) == [
+        ('cfgvehicles', 'car_f', 'turrets', 'main'),
+        ('cfgvehicles', 'hatchback', 'turrets', 'main')]
+    assert list(config.select('CfgVehicles/*[Turrets]')) == [
+        ('cfgvehicles', 'car_f'), ('cfgvehicles', 'hatchback')]
+    assert list(config.select('*/*[displayName="Car"]')) == [
+        ('cfgvehicles', 'car_f')]
+    assert list(config.select('CfgVehicles/*[displayName][scope=1]')) == [
+        ('cfgvehicles', 'car_f')]
+    assert config.select('CfgVehicles/Car_F/scope[scope]') == {}
+    assert config.select('CfgVehicles/Missing/*') == {}
+
+    with pytest.raises(ValueError):
+        config.select('CfgVehicles//scope')
+
+
+def test_descendants_of():
+    config = loads(TEST)
+    vehicles = config['CfgVehicles']
+
+    assert [x.name for x in vehicles.descendants_of('car_f')] == [
+        'Hatchback', 'Hatchback_Sport']
+    assert [x.name for x in config.descendants_of('Car_F')] == [
+        'Hatchback', 'Rifle', 'Hatchback_Sport']
+    assert [x.name for x in vehicles.descendants_of(vehicles['All'])] == [
+        'Car_F', 'Tank_F', 'Hatchback', 'Hatchback_Sport']
+    assert vehicles.descendants_of('Missing') == []
+
+    # Changes to the tree are picked up
+    vehicles.add({}, 'Van')
+    vehicles['Van'].add_inherits('Hatchback')
+
+    assert [x.name for x in vehicles.descendants_of('car_f')] == [
+        'Hatchback', 'Hatchback_Sport', 'Van']
+
+
+def test_query_index():
+    config = loads(TEST)
+    other = loads(TEST)
+    vehicles = config['CfgVehicles']
+    query = 'CfgVehicles/*[scope=2]'
+    index = config._get_query_index()
+
+    assert list(config.select(query)) == [
+        ('cfgvehicles', 'hatchback'), ('cfgvehicles', 'hatchback_sport'),
+        ('cfgvehicles', 'tank_f')]
+
+    # Changes to other trees keep the index
+    other['CfgVehicles']['Tank_F']['scope'] = 1
+
+    assert config._get_query_index() is index
+
+    vehicles['Tank_F']['scope'] = 1
+    vehicles['Hatchback']['Turrets']['Main']['scope'] = 2
+
+    assert config._get_query_index() is not index
+    assert list(config.select(query)) == [
+        ('cfgvehicles', 'hatchback'), ('cfgvehicles', 'hatchback_sport')]
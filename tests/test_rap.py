@@ -0,0 +1,68 @@
+import struct
+from armaconfig import load, loads, dumps, load_bin, loads_bin, dumps_bin
+from armaconfig.config import Config, ValueNode, DeleteNode
+from armaconfig.treecache import dumps_tree, loads_tree
+
+
+def test_read():
+    # value = -1; class A {}; class B: A { c[] = {"x", 1.5}; delete d; };
+    root = b'\0\x03' + b'\x01\x02value\0' + struct.pack('<i', -1)
+    root += b'\x00A\0' + struct.pack('<I', 16 + len(root) + 14)
+    root += b'\x00B\0' + struct.pack('<I', 16 + len(root) + 9)
+    body_a = b'\0\x00'
+    body_b = b'A\0\x02' + b'\x02c\0\x02' + b'\x00x\0'
+    body_b += b'\x01' + struct.pack('<f', 1.5) + b'\x04d\0'
+
+    header = struct.pack(
+        '<4sIII', b'\0raP', 0, 8, 16 + len(root + body_a + body_b))
+    config = loads_bin(header + root + body_a + body_b + b'\0\0\0\0')
+
+    assert config == {
+        'value': -1,
+        'a': {},
+        'b': {'c': ['x', 1.5]}
+    }
+    assert config['b'].inherits is config['a']
+    assert list(config['b'].values_raw())[-1] == DeleteNode('d')
+
+
+def test_roundtrip(tmp_path):
+    with open('files/test_config.hpp') as fp:
+        config = load(fp)
+
+    path = tmp_path / 'config.bin'
+    path.write_bytes(dumps_bin(config))
+
+    with open(path, 'rb') as fp:
+        assert load_bin(fp).to_dict() == config.to_dict()
+
+
+def test_values():
+    config = loads('''
+class Base { number = 0.1; flag = true; };
+class Child: Base { array[] = {1, -2, 2.5, "a ""b""", {}}; };
+''')
+    config.add(Config('Extern', None, config, external=True))
+    config['child'].add(DeleteNode('Removed'))
+
+    read = loads_bin(dumps_bin(config))
+
+    assert read['base'] == {'number': 0.1, 'flag': 1}
+    assert read['child']['array'] == [1, -2, 2.5, 'a "b"', []]
+    assert read['extern'].external
+    assert dumps(read) == dumps(config)
+
+
+def test_array_append():
+    config = loads('class A { x[] = {1, 2}; }; class B: A {};')
+    config['b'].add(ValueNode('x', [3], append=True))
+
+    data = dumps_bin(config)
+    assert b'\x05' + struct.pack('<I', 1) + b'x\0' in data
+
+    read = loads_bin(data)
+    assert list(read['b'].values_raw()) == [ValueNode('x', [3], True)]
+    assert dumps_bin(read) == data
+    assert dumps(read) == 'class A {x[] = {1,2};};class B : A {x[] += {3};};'
+    assert read.flatten()['b']['x'] == [1, 2, 3]
+    assert loads_tree(dumps_tree(read))['b']._get_raw('x').append
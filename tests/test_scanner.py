@@ -0,0 +1,59 @@
+
+import pytest
+from armaconfig import load, loads
+from armaconfig.entry import Scanner, EOL
+
+FILES = [
+    'files/test_config.hpp',
+    'files/test_include_master.hpp'
+]
+
+
+def _tokens(path, **kwargs):
+    with open(path) as fp:
+        scanner = Scanner(fp, **kwargs)
+        tokens = []
+
+        while True:
+            try:
+                tokens.append(scanner.next_token(include_ws=True))
+            except EOL:
+                return tokens
+
+
+@pytest.mark.parametrize('path', FILES)
+def test_regex_tokens(path):
+    assert (_tokens(path, preprocess=False, engine='regex') ==
+            _tokens(path, preprocess=False, engine='char'))
+
+
+@pytest.mark.parametrize('path', FILES)
+def test_regex_tokens_preprocessed(path):
+    # Positions differ, as they refer to the preprocessed output
+    assert (
+        [tuple(x) for x in _tokens(path, engine='regex')] ==
+        [tuple(x) for x in _tokens(path, engine='char')])
+
+
+@pytest.mark.parametrize('path', FILES)
+def test_regex_load(path):
+    with open(path) as fp:
+        expected = load(fp)
+
+    with open(path) as fp:
+        assert load(fp, engine='regex') == expected
+
+
+def test_regex_string():
+    assert loads('a = "x""y" z;b[]={"{y", 1.5};', engine='regex') == {
+        'a': 'x"y z', 'b': ['{y', 1.5]}
+
+
+def test_regex_unterminated():
+    with pytest.raises(EOL):
+        loads('a = "x;', engine='regex')
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        loads('a = 1;', engine='dfa')
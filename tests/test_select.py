@@ -0,0 +1,60 @@
+from armaconfig import loads
+from armaconfig.config import LazyConfig
+
+TEST = '''
+class CfgPatches { class Mod { units[] = {"Car"}; }; };
+class CfgVehicles {
+    class Land { speed = 1; };
+    class Car: Land { displayName = "Car"; speed = 100; };
+    class Truck: Car { class Turrets { class Main {}; }; };
+};
+class CfgWeapons { class Rifle { displayName = "Rifle"; }; };
+'''
+
+
+def test_select():
+    config = loads(TEST, preprocess=False,
+                   select=['cfgvehicles/*/displayName', 'CfgWeapons'])
+
+    assert config.to_dict() == {
+        'cfgvehicles': {
+            'land': {},
+            'car': {'displayname': 'Car'},
+            'truck': {'displayname': 'Car'}
+        },
+        'cfgweapons': {'rifle': {'displayname': 'Rifle'}}
+    }
+    assert config['CfgVehicles']['Truck'].inherits.name == 'Car'
+
+
+def test_select_lazy():
+    config = loads(TEST, select='CfgVehicles/Truck', lazy=True)
+    truck = config['CfgVehicles']['Truck']
+
+    assert list(config) == ['cfgvehicles']
+    assert list(config['CfgVehicles']) == ['truck']
+    assert isinstance(truck, LazyConfig) and not truck.loaded
+    assert truck['Turrets'].to_dict() == {'main': {}}
+
+
+def test_select_inherits_skipped():
+    config = loads(TEST, preprocess=False, select='CfgVehicles/Truck')
+    truck = config['CfgVehicles']['Truck']
+
+    assert list(config['CfgVehicles']) == ['truck']
+    assert not truck.inherits.loaded
+    assert truck['displayName'] == 'Car'
+    assert truck['speed'] == 100
+    assert truck.inherits.inherits.name == 'Land'
+
+    # Only partly selected, so not inheriting what was not selected
+    config = loads(TEST, preprocess=False, select='CfgVehicles/Truck/speed')
+
+    assert config.to_dict() == {'cfgvehicles': {'truck': {}}}
+
+
+def test_select_skips_invalid_bodies():
+    config = loads('class A { x = ;;; }; class B { y = 2; };',
+                   preprocess=False, select='B')
+
+    assert config.to_dict() == {'b': {'y': 2}}
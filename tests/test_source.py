@@ -0,0 +1,73 @@
+import io
+import codecs
+
+import pytest
+
+from armaconfig import load, loads
+from armaconfig.source import DecodedStream
+
+TEXT = 'class A {\r\n    name = "Café";\r\n    x = 1;\r\n};\r\n'
+EXPECTED = {'a': {'name': 'Café', 'x': 1}}
+
+
+def test_encodings():
+    assert loads(codecs.BOM_UTF8 + TEXT.encode('utf-8')).to_dict() == EXPECTED
+    assert loads(TEXT.encode('utf-8')).to_dict() == EXPECTED
+    assert loads(TEXT.encode('utf-16')).to_dict() == EXPECTED
+    assert loads(TEXT.encode('cp1252')).to_dict() == EXPECTED
+    assert loads(TEXT.encode('latin-1'), encoding='latin-1',
+                 preprocess=False).to_dict() == EXPECTED
+
+
+def test_files(tmp_path):
+    (tmp_path / 'inc.hpp').write_bytes(
+        'class B { name = "Über"; };\r\n'.encode('cp1252'))
+    (tmp_path / 'main.hpp').write_bytes(
+        codecs.BOM_UTF8 + ('#include "inc.hpp"\r\n' + TEXT).encode('utf-8'))
+    (tmp_path / 'empty.hpp').write_bytes(b'')
+
+    expected = dict(EXPECTED, b={'name': 'Über'})
+
+    assert load(tmp_path / 'main.hpp').to_dict() == expected
+    assert load(str(tmp_path / 'main.hpp'), lazy=True).to_dict() == expected
+
+    with open(tmp_path / 'main.hpp', 'rb') as fp:
+        assert load(fp).to_dict() == expected
+
+    assert load(tmp_path / 'empty.hpp').to_dict() == {}
+    assert load(io.BytesIO(TEXT.encode('utf-8'))).to_dict() == EXPECTED
+
+
+def test_decoded_stream():
+    data = 'a\r\né\r'.encode('utf-8') * 100
+
+    for size in (1, 2, 3, 7):
+        stream = DecodedStream(data)
+        chunks = iter(lambda: stream.read(size), '')
+
+        assert ''.join(chunks) == 'a\né\n' * 100
+        assert stream.encoding == 'utf-8'
+
+    stream = DecodedStream(b'ascii ' * 10 + 'é'.encode('cp1252'))
+
+    assert stream.read(6) == 'ascii ' and stream.encoding is None
+    assert stream.read() == 'ascii ' * 9 + 'é'
+    assert stream.encoding == 'cp1252'
+
+    # The first CP1252 byte ending a chunk
+    stream = DecodedStream(b'abcde\xc9x')
+
+    assert stream.read(6) == 'abcde'
+    assert stream.read() == '\xc9x'
+
+    # Not UTF-8 after UTF-8 has been read
+    stream = DecodedStream('é'.encode('utf-8') + b' \xff')
+    stream.read(2)
+
+    with pytest.raises(UnicodeDecodeError):
+        stream.read()
+
+    stream.close()
+
+    with pytest.raises(ValueError):
+        stream.read()
@@ -0,0 +1,39 @@
+
+import io
+import pytest
+from armaconfig import load
+from armaconfig.entry import Scanner, Streambuf, EOL
+
+TEST_FILE = 'files/test_config.hpp'
+
+
+def _tokens(string, **kwargs):
+    scanner = Scanner(io.StringIO(string), **kwargs)
+    tokens = []
+
+    while True:
+        try:
+            tokens.append(scanner.next_token(include_ws=True))
+        except EOL:
+            return tokens
+
+
+@pytest.mark.parametrize('preprocess', [True, False])
+def test_chunked_positions(monkeypatch, preprocess):
+    with open(TEST_FILE) as fp:
+        string = fp.read()
+
+    monkeypatch.setattr(Streambuf, 'CHUNK_SIZE', 1)
+    expected = _tokens(string, preprocess=preprocess)
+
+    for size in (2, 3, 7, 64):
+        monkeypatch.setattr(Streambuf, 'CHUNK_SIZE', size)
+
+        assert _tokens(string, preprocess=preprocess) == expected
+
+
+def test_chunked_include(monkeypatch):
+    monkeypatch.setattr(Streambuf, 'CHUNK_SIZE', 4)
+
+    with open('files/test_include_master.hpp') as fp:
+        assert load(fp) == {'test': {'a': 3}}
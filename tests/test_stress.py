@@ -0,0 +1,20 @@
+
+from armaconfig import loads
+
+BLANK_LINES = 200000
+COMMENTS = 100000
+
+
+def test_blank_lines():
+    assert loads('a = 1;' + '\n' * BLANK_LINES + 'b = 2;') == {'a': 1, 'b': 2}
+
+
+def test_comments():
+    string = 'a = 1;\n%s%sb = 2;' % (
+        '// comment\n' * COMMENTS, '/* comment */' * COMMENTS)
+
+    assert loads(string) == {'a': 1, 'b': 2}
+
+
+def test_whitespace_in_value():
+    assert loads('a[] = {1,%s2};' % (' \t' * BLANK_LINES)) == {'a': [1, 2]}
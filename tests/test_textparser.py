@@ -0,0 +1,41 @@
+
+import pytest
+from armaconfig import load, loads
+from armaconfig.exceptions import UnexpectedType, UnexpectedValue, EOL
+
+TEST_FILE = 'files/test_config.hpp'
+
+
+def test_load():
+    with open(TEST_FILE) as fp:
+        expected = load(fp)
+
+    with open(TEST_FILE) as fp:
+        assert load(fp, preprocess=False) == expected
+
+
+@pytest.mark.parametrize('string', [
+    'oned[] = {1, two, 3, "4", 5 six seven};',
+    'multi[] = {1, {2, 3}, {{4, 5, 6 seven, {}}}};',
+    'string = {"array"};',
+    'joined = unquoted and "quoted" strings "joined" together;',
+    'escaped = "this ""string"" is ""escaped"".";',
+    'empty[] = { }; value = "a;b" c;',
+    'class a { class b { x = 1; }; }; class c : a {};'
+])
+def test_same_as_parser(string):
+    assert loads(string, preprocess=False) == loads(string)
+
+
+@pytest.mark.parametrize('string, err', [
+    ('prop } "3";', UnexpectedValue),
+    ('class test [property = 3;};', UnexpectedValue),
+    ('class test {property = 3;];', UnexpectedType),
+    ('array[] = [2, 1};', UnexpectedValue),
+    ('array[] = {{1} 2};', UnexpectedValue),
+    ('class test {', EOL),
+    ('string = "unterminated;', EOL)
+])
+def test_errors(string, err):
+    with pytest.raises(err):
+        loads(string, preprocess=False)
@@ -0,0 +1,87 @@
+import struct
+import pytest
+import armaconfig.treecache
+from armaconfig import load, loads
+from armaconfig.config import Config
+from armaconfig.treecache import dumps_tree, loads_tree, read_dependencies
+
+
+def assert_same_tree(a, b):
+    assert a.name == b.name
+    assert list(a.iter_self()) == list(b.iter_self())
+    assert (a.inherits is None) == (b.inherits is None)
+
+    if a.inherits is not None:
+        assert a.inherits.name == b.inherits.name
+        assert b.parent.get_config(b.inherits.name) is b.inherits
+
+    for key, node in a.items_raw():
+        other = b._get_raw(key)
+
+        if isinstance(node, Config):
+            assert other.parent is b
+            assert_same_tree(node, other)
+        else:
+            assert node == other and type(node.value) is type(other.value)
+
+
+def test_roundtrip():
+    with open('files/test_config.hpp') as fp:
+        config = load(fp)
+
+    assert_same_tree(config, loads_tree(dumps_tree(config)))
+
+    config = loads('''
+class Base { x = 1; big = 100000000000000000000000; };
+class Child: Base {
+    array[] = {1, 2.5, "three", {true, {}}};
+    class Nested: Base { text = "a ""quoted"" string"; };
+};
+''')
+    tree = loads_tree(dumps_tree(config, {'file': (1, 2)}))
+
+    assert_same_tree(config, tree)
+    assert tree['child']['nested']['x'] == 1
+    assert read_dependencies(dumps_tree(config, {'file': (1, 2)})) == {
+        'file': (1, 2)}
+
+
+def test_version():
+    data = bytearray(dumps_tree(loads('x = 1;')))
+    struct.pack_into('<H', data, 8, 7)
+
+    with pytest.raises(ValueError, match='version 7'):
+        loads_tree(data)
+
+    with pytest.raises(ValueError, match='Not a serialized'):
+        loads_tree(b'NOTATREE' + bytes(data[8:]))
+
+
+def test_load_cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    header = tmp_path / 'header.hpp'
+    main = tmp_path / 'main.cpp'
+
+    header.write_text('#define VALUE 1\n')
+    main.write_text('#include "header.hpp"\nvalue = VALUE;\n')
+
+    def load_main():
+        with open(main) as fp:
+            return load(fp, cache_dir=cache_dir)
+
+    assert load_main() == {'value': 1}
+    assert len(list(cache_dir.iterdir())) == 1
+
+    def decode(*args, **kwargs):
+        raise AssertionError('decoded instead of read from the cache')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(armaconfig.treecache, 'decode', decode)
+
+        cached = load_main()
+
+    assert cached == {'value': 1}
+    assert cached.name == str(main)
+
+    header.write_text('#define VALUE 123\n')
+    assert load_main() == {'value': 123}
@@ -1,6 +1,10 @@
 
+import array
+import pickle
 import pytest
-from armaconfig import loads
+from armaconfig import loads, dumps, encode, loads_bin, dumps_bin
+from armaconfig.treecache import loads_tree, dumps_tree
+from armaconfig.config import ValueNode
 from armaconfig.exceptions import Unexpected
 
 
@@ -48,3 +52,44 @@ def test_string_escaped():
     assert (
         loads('escaped = "this ""string"" is ""escaped"".";') ==
         {'escaped': 'this "string" is "escaped".'})
+
+
+def test_compact():
+    string = 'class A { Value = 1; array[] = {1, "a"}; };\nclass B: A {};'
+    config = loads(string, compact=True)
+
+    assert config.to_dict() == loads(string).to_dict()
+    assert config['a']._dict['value'] == 1
+    assert list(config['b'].values_raw()) == []
+    assert list(config['a'].values_raw()) == [
+        ValueNode('Value', 1), ValueNode('array', [1, 'a'])]
+    assert dumps(config) == dumps(loads(string))
+    assert dumps(config.flatten()) == dumps(loads(string).flatten())
+    assert not hasattr(config, '__dict__')
+    assert dumps(pickle.loads(pickle.dumps(config))) == dumps(config)
+
+
+def test_numeric_arrays():
+    string = ('a[] = {1, 2, 3};\nb[] = {1, 2.5, -3e2};\n'
+              'c[] = {1, "two"};\nd[] = {{1, 2}, {0.5}, {}};\ne[] = {true};'
+              'f[] = {2.5, 100000000000000000};')
+    config = loads(string, numeric_arrays='array')
+
+    assert config['a'] == array.array('q', [1, 2, 3])
+    assert config['b'] == array.array('d', [1, 2.5, -300])
+    assert config['c'] == [1, 'two']
+    assert config['d'] == [array.array('q', [1, 2]), array.array('d', [0.5]),
+                           []]
+    assert config['e'] == [True]
+    assert config['f'] == [2.5, 100000000000000000]
+    assert dumps(config) == dumps(loads(string))
+    assert loads_tree(dumps_tree(config)).to_dict() == config.to_dict()
+    assert loads_bin(dumps_bin(config)).to_dict() == loads(string).to_dict()
+
+
+def test_float_output():
+    # Only floats in arrays of floats are written as ints
+    config = {'a': 1.0, 'b': 1e20, 'c': 2.5, 'd': array.array('d', [1, 1e20])}
+
+    assert dumps(config) == 'a = 1.0;b = 1e+20;c = 2.5;d[] = {1,1e+20};'
+    assert dumps(config) == ''.join(encode(config))